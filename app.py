@@ -1,36 +1,54 @@
+import atexit
 import os
 
 is_windows = os.name == "nt"
-from threading import Lock
 from flask_cors import CORS
 from flask import Flask, request, jsonify, url_for
 
 if not is_windows:
     import gevent.monkey
     gevent.monkey.patch_all()
+from threading import Lock # After patching, so locks are greenlet aware
 
 from src.utils.floyd import get_floyd_data, get_floyd_maps, parse_floyd_data
-from src.utils.floyd_randomizer import convert_profile_id_to_seed, create_seeds_from_key, make_platform_string, shuffler
+from src.utils.floyd_randomizer import make_platform_string
+from src.utils import floyd_cache
+from src.utils.concurrency import spawn
+from src.utils.player_store import PlayerModuleStore
+from src.utils.tokens import TokenManager
+from src.utils.floyd_batch import forecast_challenges, search_counters
+from src.utils.jsonlib import FastJSONProvider
 from src.utils import init_secrets
-steam_key, *_ = init_secrets()
+steam_keys, *_ = init_secrets()
 
+from src.api.errors import CircuitOpen, TokenExpired
 from src.api.mk12 import MK12API
+from src.api.mk12_pool import MK12APIPool
 from src.api.wb import WBAPI
-from src.api.user_ids import is_valid_steam_id, sanitize_steam_user_id
+from src.api.user_ids import is_valid_steam_id, sanitize_steam_user_id, xbox_client
 from src.routes.platforms import find_any, platform_bp, sanitize_platform
+from src.routes.challenges import challenges_bp, make_counter_floyd_string
 
-mk_lock = Lock()
-api = MK12API(steam_key=steam_key)
-api.set_mutex_lock(mk_lock)
-api.login()
+hits_lock = Lock()
+api = MK12APIPool.from_steam_keys(steam_keys)
 
 wb_lock = Lock()
-wb_api = WBAPI(authorization_code=api.wb_authorization_code) # Auth code is one time use
+wb_api = WBAPI(authorization_code=api.primary.wb_authorization_code) # Auth code is one time use
 wb_api.set_mutex_lock(wb_lock)
 
+player_store = PlayerModuleStore(ttl=float(os.environ.get("PLAYER_MODULE_TTL", 7 * 24 * 3600)))
+
+token_manager = TokenManager()
+for i, client in enumerate(api.clients):
+    token_manager.register(f"mk12-{i}" if len(api) > 1 else "mk12", client)
+token_manager.register("wb", wb_api)
+token_manager.register("xbox", xbox_client)
+
 app = Flask("Floyd Tracker")
+app.json = FastJSONProvider(app)
 CORS(app, resources={r"/*": {"origins": "*"}})
 app.register_blueprint(platform_bp, url_prefix="/platforms")
+app.register_blueprint(challenges_bp, url_prefix="/challenges")
 
 try:
     with open("db/hits.txt", "r") as f:
@@ -41,10 +59,33 @@ except Exception as e:
 
 print("Starting with hits", id_hits, data_hits)
 
+floyd_cache.load_snapshot()
+snapshot_worker = floyd_cache.SnapshotWorker(interval=float(os.environ.get("FLOYD_SNAPSHOT_INTERVAL", 600)))
+atexit.register(snapshot_worker.tick) # Last save on shutdown, skipped if nothing changed
+
+MAX_FORECAST = 100
+MAX_COUNTER_SEARCH = 200_000 # ~0.1s of blocking numpy work
+MAX_WAIT = 30
+
+@app.errorhandler(CircuitOpen)
+def circuit_open_handler(e):
+    return jsonify(error=str(e)), 503
+
+@app.errorhandler(TokenExpired)
+def token_expired_handler(e):
+    return jsonify(error="Upstream session expired and couldn't be renewed, please try again later."), 503
+
+@app.before_request
+def start_background_workers():
+    token_manager.ensure_started() # Lazily so it runs in the gunicorn worker and not only the preloading master
+    wb_api.invitations.ensure_started()
+    wb_api.declines.ensure_started()
+    snapshot_worker.ensure_started()
+
 # @app.before_request
 # def load_globals():
 #     g.api = api
-#     g.mk_lock = mk_lock
+#     g.hits_lock = hits_lock
 #     g.wb_api = wb_api
 #     g.wb_lock = wb_lock
 
@@ -57,12 +98,33 @@ def write_hits():
 def write_hits_mutex():
     if (id_hits+data_hits) % 200 != 1:
         return
-    if api.lock:
-        with api.lock:        
-            write_hits()
-    else:
+    with hits_lock:
         write_hits()
 
+def make_forecast(hashed: int, floyd_counter: int, count: int):
+    challenges = forecast_challenges(hashed, floyd_counter, count).tolist()
+    return [
+        {"encounters": floyd_counter + i, "challenges": c}
+        for i, c in enumerate(challenges)
+    ]
+
+def get_player_modules(user_id: str, platform: str):
+    modules, fresh = player_store.get(platform, user_id)
+    if modules and fresh:
+        return modules
+
+    try:
+        fetched = api.get_mk_id_from_wb(user_id, platform).get("player_modules", [])
+    except Exception as e:
+        if not modules:
+            raise
+        print(f"Revalidating player modules for {user_id} on {platform} failed ({e}), serving stored ones")
+        return modules
+
+    if fetched:
+        player_store.set(platform, user_id, fetched)
+    return fetched
+
 @app.route("/id")
 def get_wb_id_route():
     global id_hits
@@ -111,6 +173,49 @@ def get_wb_id_route():
         "platform": platform,
     })
 
+@app.route("/id/wait")
+def wait_wb_id_route():
+    """
+    Long poll version of `/id` for `wb_incoming` / `wb_outgoing` / `wb_friends`, answers as soon as
+    the invitation shows up or with a 404 after `timeout` seconds.
+    """
+    params = request.args
+
+    platform = sanitize_platform(params.get("platform", ""))
+    username = params.get("username", "").strip()
+
+    if not username or not platform:
+        return jsonify(error="`platform` and `username` are both required!"), 400
+    if not platform.startswith("wb_") or platform == "wb_network":
+        return jsonify(error="Only `wb_incoming`, `wb_outgoing` and `wb_friends` can be waited on."), 400
+    if username.isdigit():
+        return jsonify(error=f"Please enter a username instead of a number."), 403
+
+    try:
+        timeout = float(params.get("timeout", MAX_WAIT))
+    except ValueError:
+        return jsonify(error="`timeout` must be a number."), 400
+    if not 0 <= timeout <= MAX_WAIT:
+        return jsonify(error=f"`timeout` must be between 0 and {MAX_WAIT}."), 400
+
+    search_by = platform.split("_", 1)[-1]
+    view = "friends" if search_by in ["friends", "friend"] else search_by
+    if view not in wb_api.invitations.indexes:
+        return jsonify(error=f"What is {search_by}?"), 400
+
+    user_id = wb_api.wait_by(username, view, timeout)
+    if user_id:
+        user_id = user_id.get("public_id", "")
+
+    if not user_id:
+        return jsonify(error=f"Couldn't find user {username}"), 404
+
+    return jsonify({
+        "username": username,
+        "user_id": user_id,
+        "platform": platform,
+    })
+
 @app.get("/data")
 def get_floyd_data_route():
     global data_hits
@@ -126,11 +231,18 @@ def get_floyd_data_route():
             error=f"`user_id`, `platform`, and `username` are required. Info retrieved automatically from {url_for('get_wb_id_route')}"
         )
 
+    try:
+        forecast = int(request.args.get("forecast", 0))
+    except ValueError:
+        return jsonify(error="`forecast` must be a number."), 400
+    if forecast < 0 or forecast > MAX_FORECAST:
+        return jsonify(error=f"`forecast` must be between 0 and {MAX_FORECAST}."), 400
+
     print(f"Received a request for getting id for {user_id} on {platform}")
 
     platform = sanitize_platform(platform, wb=True)
 
-    modules = api.get_mk_id_from_wb(user_id, platform).get("player_modules", [])
+    modules = get_player_modules(user_id, platform)
     if not len(modules):
         return jsonify(error=f"User found but no id was returned from mk servers. If you're on Nintendo Switch, sorry that doesn't work now. If you're not on Switch then either your WB account isn't linked to this profile, or try again later."), 404
 
@@ -142,12 +254,16 @@ def get_floyd_data_route():
     wbpn_id = player_module["wbpn_id"]
     hydra_name = player_module["wbpn_name"]
 
-    profile = api.get_profile(hydra_id)
-    floyd_data = get_floyd_data(profile)
-    parsed_data = parse_floyd_data(floyd_data, hydra_platform)
-    floyd_map = get_floyd_maps()
-
     supported_floyd_guess_platforms = ["ps5", "steam", "xsx", "epic"]
+    floyd_allowed_platforms = ["ps5", "xsx", "steam", "epic", "nx"]
+
+    # Both only depend on hydra_id, fetch the account alongside the profile instead of after it
+    account_task = None
+    if platform == "wb_network" and hydra_platform not in floyd_allowed_platforms:
+        account_task = spawn(api.get_account, hydra_id)
+
+    profile = api.get_floyd_profile(hydra_id)
+    floyd_map = get_floyd_maps()
 
     floyd_platform = platform
     floyd_string = floyd_string_offline = ""
@@ -157,10 +273,10 @@ def get_floyd_data_route():
         floyd_platform_id = hydra_platform_id
         floyd_platform_name = platform_name
         found = True
-        if floyd_platform not in ["ps5", "xsx", "steam", "epic", "nx"]: # Not allowed
+        if floyd_platform not in floyd_allowed_platforms and account_task: # Not allowed
             # If has no platform id then try to get his steam info cuz the rest have no id exposed
             try:
-                account = api.get_account(hydra_id)
+                account = account_task.get()
                 alternate_identities = account["identity"]["alternate"]
                 if "steam" in alternate_identities: # Only steam id is exposed
                     floyd_platform = "steam"
@@ -190,29 +306,38 @@ def get_floyd_data_route():
             floyd_string_offline = make_platform_string(floyd_platform, floyd_platform_id)
         floyd_string = make_platform_string(platform, floyd_platform_id, hydra_id, wbpn_id)
 
-    floyd_challenges = []
-    floyd_challenges_offline = []
-    if floyd_string:
-        hashed = convert_profile_id_to_seed(floyd_string)
-        # replace with floyd counter
-        floyd_counter = parsed_data.get("parsed", {}).get("encounters", 0)
-        seed1, seed2 = create_seeds_from_key(hashed, floyd_counter)
-
-        floyd_challenges = list(range(37))
-        shuffler(floyd_challenges, seed1, seed2, 10)
-
-        floyd_challenges = [a + 1 for a in floyd_challenges[:10]]
-        print(floyd_string, hashed, floyd_counter, "\n", floyd_challenges)
-    if floyd_string_offline:
-        hashed = convert_profile_id_to_seed(floyd_string_offline)
-        floyd_counter = parsed_data.get("parsed", {}).get("encounters_offline", 0)
-        seed1, seed2 = create_seeds_from_key(hashed, floyd_counter)
-
-        floyd_challenges_offline = list(range(37))
-        shuffler(floyd_challenges_offline, seed1, seed2, 10)
-
-        floyd_challenges_offline = [a + 1 for a in floyd_challenges_offline[:10]]
-        print("offline", floyd_string_offline, hashed, floyd_counter, "\n", floyd_challenges_offline)
+    change_count = profile.get("data", {}).get("change_count")
+    cache_tag = (change_count, hydra_platform, floyd_string, floyd_string_offline)
+    cached = floyd_cache.get_parsed_profile(hydra_id, cache_tag) if change_count is not None else None
+    if cached:
+        parsed_data, floyd_challenges, floyd_challenges_offline = cached
+    else:
+        floyd_data = get_floyd_data(profile)
+        parsed_data = parse_floyd_data(floyd_data, hydra_platform)
+
+        floyd_challenges = []
+        floyd_challenges_offline = []
+        if floyd_string:
+            # replace with floyd counter
+            floyd_counter = parsed_data.get("parsed", {}).get("encounters", 0)
+            hashed, floyd_challenges = floyd_cache.get_cached_challenges(floyd_string, floyd_counter)
+            print(floyd_string, hashed, floyd_counter, "\n", floyd_challenges)
+        if floyd_string_offline:
+            floyd_counter = parsed_data.get("parsed", {}).get("encounters_offline", 0)
+            hashed, floyd_challenges_offline = floyd_cache.get_cached_challenges(floyd_string_offline, floyd_counter)
+            print("offline", floyd_string_offline, hashed, floyd_counter, "\n", floyd_challenges_offline)
+
+        if change_count is not None:
+            floyd_cache.set_parsed_profile(hydra_id, cache_tag, (parsed_data, floyd_challenges, floyd_challenges_offline))
+
+    floyd_forecast = {"online": [], "offline": []}
+    if forecast:
+        if floyd_string:
+            floyd_counter = parsed_data.get("parsed", {}).get("encounters", 0)
+            floyd_forecast["online"] = make_forecast(floyd_cache.get_seed(floyd_string), floyd_counter, forecast)
+        if floyd_string_offline:
+            floyd_counter = parsed_data.get("parsed", {}).get("encounters_offline", 0)
+            floyd_forecast["offline"] = make_forecast(floyd_cache.get_seed(floyd_string_offline), floyd_counter, forecast)
 
 
     if username.lower().strip() == user_id.lower().strip(): # no username found
@@ -254,6 +379,8 @@ def get_floyd_data_route():
             "offline": floyd_challenges_offline,
         },
     }
+    if forecast:
+        parsed_data["challenges"]["forecast"] = floyd_forecast
 
     metadata = {
         "hits": {
@@ -264,6 +391,74 @@ def get_floyd_data_route():
 
     return jsonify(user=user_obj, data=parsed_data, meta=metadata)
 
+@app.get("/counter")
+def search_floyd_counter_route():
+    challenges = request.args.get("challenges", "").strip()
+    if not challenges:
+        return jsonify(error="`challenges` is required!"), 400
+
+    try:
+        platform_string = make_counter_floyd_string(request.args.to_dict()) # Rejects invalid steam ids
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    try:
+        observed = {int(c) for c in challenges.split(",") if c.strip()}
+        max_counter = int(request.args.get("max_counter", 100_000))
+        near = int(request.args.get("near", 0))
+    except ValueError:
+        return jsonify(error="`challenges`, `max_counter` and `near` must be numbers."), 400
+
+    if not observed or any(c < 1 or c > 37 for c in observed):
+        return jsonify(error="`challenges` must be comma separated ids between 1 and 37."), 400
+    if max_counter < 0 or max_counter > MAX_COUNTER_SEARCH:
+        return jsonify(error=f"`max_counter` must be between 0 and {MAX_COUNTER_SEARCH}."), 400
+
+    print(f"Searching counter for {platform_string} up to {max_counter} with {sorted(observed)}")
+
+    hashed = floyd_cache.get_seed(platform_string)
+    candidates = search_counters(hashed, observed, max_counter, near=near)
+
+    return jsonify(candidates=[
+        {
+            "encounters": counter,
+            "matches": matches,
+            "score": matches / len(observed),
+        }
+        for counter, matches in candidates
+    ])
+
+
+@app.get("/stats")
+def get_stats_route():
+    return jsonify(
+        hits={
+            "lookup": id_hits,
+            "profile": data_hits,
+        },
+        cache={
+            "floyd": dict(floyd_cache.get_stats(), snapshots=snapshot_worker.stats()),
+            "hydra": MK12API.response_cache.stats(),
+            "wb_search": WBAPI.search_stats(),
+        },
+        player_modules={
+            "store": player_store.stats(),
+            "batcher": MK12API.player_modules_batcher.stats(),
+        },
+        tokens=token_manager.stats(),
+        mk12_pool=api.stats(),
+        wb_invitations=wb_api.invitations.stats(),
+        wb_declines=wb_api.declines.stats(),
+        upstreams={
+            "mk12": [client.upstream.stats() for client in api.clients],
+            "wb": WBAPI.upstream.stats(),
+        },
+        single_flight={
+            "mk12": MK12API.flights.stats(),
+            "wb": WBAPI.flights.stats(),
+        },
+    )
+
 
 if __name__ == "__main__":
     if not is_windows:
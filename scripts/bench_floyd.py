@@ -0,0 +1,225 @@
+"""
+Floyd randomizer benchmarks and golden vector checks.
+
+    python -m scripts.bench_floyd              # check golden vectors then benchmark
+    python -m scripts.bench_floyd --check      # golden vectors only
+    python -m scripts.bench_floyd --generate   # rewrite the golden vectors from `reference_shuffler`
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from typing import Callable, List
+
+from src.utils.floyd import get_floyd_data, parse_floyd_data
+from src.utils.floyd_randomizer import (
+    FloydRng,
+    convert_profile_id_to_seed,
+    create_seeds_from_key,
+    get_challenges,
+    make_platform_string,
+    shuffler,
+)
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "floyd_golden.json")
+GOLDEN_PLATFORMS = ["steam", "ps5", "xsx", "epic"]
+
+
+def reference_shuffler(array: List[int], seed_1: int, seed_2: int, limit: int = -1):
+    """
+    The original PCG loop of `floyd_randomizer.shuffler`, kept verbatim as the reference the optimized
+    engines are checked and benchmarked against.
+    """
+    length = len(array)
+    cycles = range(length) # Perhaps -1 since last 2 arrays are always the same
+    if limit > 0:
+        cycles = range(limit)
+
+    for v15 in cycles:
+        v4 = seed_2
+        v5 = (-length & 0xFFFFFFFF) % length
+        v8 = v5 - 1  # This is only to enable the while loop
+        while v8 < v5:
+            v6 = seed_1
+            v7 = seed_1 >> 45
+            seed_1 = 0x5851F42D4C957F2D * seed_1
+            seed_1 &= 0xFFFFFFFFFFFFFFFF
+            seed_1 += v4
+            seed_1 &= 0xFFFFFFFFFFFFFFFF
+            xor_v = ((v6 >> 27) ^ v7) & 0xFFFFFFFF
+            shift_amt = (
+                -(v6 >> 59) & 0x1F
+            ) & 0xFFFFFFFFFFFFFFFF  # I think something is wrong here
+            left_shift = xor_v << (
+                shift_amt & 0xFFFFFFFF
+            )  # the shift_amt is int64 but xor_v is int32 and we can't afford overflow
+            left_shift &= 0xFFFFFFFF
+
+            l_right_shift = v6 >> 59
+            v8 = (xor_v >> l_right_shift) | left_shift
+            v8 &= 0xFFFFFFFF
+        index = v8 % length
+        index += v15
+        length -= 1
+        if index != v15:  # Shuffle if it's not this index
+            v20 = array[index]
+            v21 = v20
+            array[index] = array[v15]
+            array[v15] = v21
+
+
+def reference_challenges(floyd_string: str, floyd_counter: int) -> List[int]:
+    hashed = convert_profile_id_to_seed(floyd_string)
+    seed_1, seed_2 = create_seeds_from_key(hashed, floyd_counter)
+    array = list(range(37))
+    reference_shuffler(array, seed_1, seed_2, 10)
+    return [a + 1 for a in array[:10]]
+
+
+def shuffler_challenges(hashed: int, floyd_counter: int) -> List[int]:
+    seed_1, seed_2 = create_seeds_from_key(hashed, floyd_counter)
+    array = list(range(37))
+    shuffler(array, seed_1, seed_2, 10)
+    return [a + 1 for a in array[:10]]
+
+
+def make_golden_vectors(count: int = 200) -> List[dict]:
+    rand = random.Random(9002)
+    vectors = []
+    for i in range(count):
+        platform = GOLDEN_PLATFORMS[i % len(GOLDEN_PLATFORMS)]
+        platform_id = str(rand.getrandbits(64))
+        if i % 8 == 0 and platform == "steam":
+            floyd_string = make_platform_string(platform, platform_id) # Offline string
+        else:
+            floyd_string = make_platform_string(platform, platform_id, f"{rand.getrandbits(128):032x}", f"{rand.getrandbits(128):032x}")
+        floyd_counter = rand.choice([0, 1, rand.randrange(100), rand.randrange(1 << 16), rand.getrandbits(32)])
+        vectors.append({
+            "platform_string": floyd_string,
+            "encounters": floyd_counter,
+            "hashed": convert_profile_id_to_seed(floyd_string),
+            "challenges": reference_challenges(floyd_string, floyd_counter),
+        })
+    return vectors
+
+
+def load_golden_vectors() -> List[dict]:
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_golden_vectors(vectors: List[dict]) -> bool:
+    engines = {
+        "reference_shuffler": [reference_challenges(v["platform_string"], v["encounters"]) for v in vectors],
+        "shuffler": [shuffler_challenges(v["hashed"], v["encounters"]) for v in vectors],
+        "FloydRng": [get_challenges(v["hashed"], v["encounters"]) for v in vectors],
+    }
+    try:
+        from src.utils.floyd_batch import get_challenges_batch
+    except ImportError:
+        print("numpy not installed, skipping floyd_batch")
+    else:
+        hashes = [v["hashed"] for v in vectors]
+        counters = [v["encounters"] for v in vectors]
+        engines["floyd_batch"] = get_challenges_batch(hashes, counters).tolist()
+
+    ok = True
+    for i, v in enumerate(vectors):
+        if convert_profile_id_to_seed(v["platform_string"]) != v["hashed"]:
+            print(f"Hash mismatch for {v['platform_string']}")
+            ok = False
+        for name, results in engines.items():
+            if results[i] != v["challenges"]:
+                print(f"{name} mismatch for {v['platform_string']} @ {v['encounters']}: {results[i]} != {v['challenges']}")
+                ok = False
+
+    print(f"Checked {len(vectors)} golden vectors against {', '.join(engines)}: {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def make_sample_profile() -> dict:
+    trophy = {}
+    for platform in ["ps5_", "xsx_", ""]:
+        trophy.update({
+            f"{platform}profilestat9001": 1,
+            f"{platform}profilestat9002": 42,
+            f"{platform}profilestat9003": 0b1010000000000000000000000000000010111,
+            f"{platform}profilestat9004": 12,
+            f"{platform}profilestat9005": 7,
+            f"{platform}profilestat9006": 321,
+            f"{platform}profilestat9100": {"Sub-Zero": 3, "Scorpion": 6},
+            f"{platform}profilestat9101": {"Sub-Zero": 1},
+            f"{platform}profilestat9102": 1,
+            f"{platform}profilestat9103": 0,
+            f"{platform}profilestat9104": 2048,
+            f"{platform}profilestat9105": 12,
+            f"{platform}profilestat9106": 2,
+        })
+    return {"data": {"game": {"profile_stats": {"bitmask": {}, "trophy": trophy}}, "change_count": 1}}
+
+
+def data_path(profile: dict, floyd_string: str):
+    parsed_data = parse_floyd_data(get_floyd_data(profile), "steam")
+    hashed = convert_profile_id_to_seed(floyd_string)
+    return get_challenges(hashed, parsed_data["parsed"]["encounters"])
+
+
+def benchmark(name: str, func: Callable, runs: int = 20_000):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter_ns()
+        func()
+        timings.append(time.perf_counter_ns() - start)
+
+    timings.sort()
+    mean = statistics.fmean(timings)
+    p50 = timings[len(timings) // 2]
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"{name:<32} {1e9 / mean:>12,.0f} ops/s   p50 {p50 / 1000:>8.2f}us   p99 {p99 / 1000:>8.2f}us")
+
+
+def run_benchmarks(runs: int):
+    floyd_string = make_platform_string("steam", "76561198000000000", "0" * 32, "f" * 32)
+    hashed = convert_profile_id_to_seed(floyd_string)
+    seed_1, seed_2 = create_seeds_from_key(hashed, 42)
+    profile = make_sample_profile()
+
+    benchmark("convert_profile_id_to_seed", lambda: convert_profile_id_to_seed(floyd_string), runs)
+    benchmark("create_seeds_from_key", lambda: create_seeds_from_key(hashed, 42), runs)
+    benchmark("reference_shuffler (limit=10)", lambda: reference_shuffler(list(range(37)), seed_1, seed_2, 10), runs)
+    benchmark("shuffler (limit=10)", lambda: shuffler(list(range(37)), seed_1, seed_2, 10), runs)
+    benchmark("FloydRng.partial_shuffle", lambda: FloydRng(seed_1, seed_2).partial_shuffle(37, 10), runs)
+    benchmark("/data computation path", lambda: data_path(profile, floyd_string), runs)
+
+    try:
+        import numpy as np
+        from src.utils.floyd_batch import get_challenges_batch
+    except ImportError:
+        return
+
+    counters = np.arange(1000, dtype=np.uint64)
+    batch_runs = max(runs // 100, 10)
+    print(f"{'(batch rows below are per 1000 counters)':<32}")
+    benchmark("get_challenges_batch", lambda: get_challenges_batch(hashed, counters), batch_runs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generate", action="store_true", help="Regenerate the golden vectors from `reference_shuffler`")
+    parser.add_argument("--check", action="store_true", help="Only check the golden vectors")
+    parser.add_argument("--runs", type=int, default=20_000, help="Iterations per benchmark")
+    args = parser.parse_args()
+
+    if args.generate:
+        vectors = make_golden_vectors()
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            f.write("[\n" + ",\n".join(json.dumps(v) for v in vectors) + "\n]\n") # One vector per line keeps diffs readable
+        print(f"Wrote {len(vectors)} golden vectors to {GOLDEN_PATH}")
+
+    if not check_golden_vectors(load_golden_vectors()):
+        raise SystemExit(1)
+
+    if not args.check:
+        run_benchmarks(args.runs)
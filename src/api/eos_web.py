@@ -1,6 +1,7 @@
 import os
 import urllib.parse
-import requests
+
+from src.api.http import get_session
 
 
 class EpicWebAuth:
@@ -38,7 +39,7 @@ class EpicWebAuth:
             }
             auth = (client_id, client_secret)
             url = EpicWebAuth.make_url("token")
-            resp = requests.post(url, data=data, auth=auth)
+            resp = get_session("epic").post(url, data=data, auth=auth)
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
@@ -49,7 +50,7 @@ class EpicWebAuth:
         try:
             headers = {"Authorization": f"Bearer {access_token}"}
             url = EpicWebAuth.make_url("userInfo")
-            resp = requests.get(url, headers=headers)
+            resp = get_session("epic").get(url, headers=headers)
             resp.raise_for_status()
             return resp.json()
         except Exception as e:
@@ -66,7 +67,7 @@ class EpicWebAuth:
             data = {"token": access_token, "token_type_hint": "access_token"}
             auth = (client_id, client_secret)
             url = EpicWebAuth.make_url("revoke")
-            resp = requests.post(url, data=data, auth=auth)
+            resp = get_session("epic").post(url, data=data, auth=auth)
             resp.raise_for_status()
             return {"success": True}
         except Exception as e:
@@ -1 +1,2 @@
-class TokenExpired(Exception): ...
\ No newline at end of file
+class TokenExpired(Exception): ...
+class CircuitOpen(Exception): ...
@@ -0,0 +1,46 @@
+import os
+from http.cookiejar import DefaultCookiePolicy
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Per upstream keep-alive pools. Non blocking pools so greenlets never wait on each other for a socket,
+# connections beyond `POOL_MAXSIZE` are opened and then discarded instead of kept alive.
+POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 4))
+POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 64))
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 20))
+
+
+class PooledSession(requests.Session):
+    def __init__(self, pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE, timeout: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT)):
+        super().__init__()
+        self.timeout = timeout
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[])) # Stay stateless like module level requests, sessions are shared between users
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=False)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, *args, **kwargs)
+
+
+_sessions: Dict[str, PooledSession] = {}
+_sessions_lock = Lock()
+
+
+def get_session(upstream: str, pool_maxsize: Optional[int] = None) -> PooledSession:
+    """
+    Shared session for `upstream` (mk12, wb, xbox, psn, epic...), created on first use.
+    """
+    session = _sessions.get(upstream)
+    if session:
+        return session
+
+    with _sessions_lock:
+        if upstream not in _sessions:
+            _sessions[upstream] = PooledSession(pool_maxsize=pool_maxsize or POOL_MAXSIZE)
+        return _sessions[upstream]
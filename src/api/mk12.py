@@ -1,15 +1,29 @@
 import os
+import time
 import uuid
 import requests
 
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from steam.steamid import SteamID
+from typing import Dict, List, Union
 
+from src.api.http import get_session
 from src.models.mk12.access import Access, Profile
 from src.models.mk12.account import Account
 from src.models.mk12.envelope import ssc_envelope_response_from_dict
 from src.models.mk12.responses.error import HydraError
 from src.models.mk12.wb.player_modules import PlayerModules
-from src.utils import prevent_over_refresh
+from src.api.errors import TokenExpired
+from src.utils import prevent_over_refresh, retry_on_failure
+from src.utils.batcher import MicroBatcher
+from src.utils.cache import StaleWhileRevalidateCache, stale_while_revalidate
+from src.utils.concurrency import spawn
+from src.utils.floyd import extract_floyd_profile
+from src.utils.jsonlib import response_json
+from src.utils.resilience import ResilientCaller
+from src.utils.singleflight import SingleFlight, single_flight
+from src.utils.tokens import get_token_expiry
 
 class MK12API:
     ROOT_URL = "https://k1-api.wbagora.com"
@@ -17,11 +31,31 @@ class MK12API:
     INVOKE_URL = SSC_URL + "/invoke"
     HYDRA_KEY = os.environ.get("MK12_API_KEY", "")
     CURRENT_GAME_VERSION = "0.294"
+    TOKEN_TTL = float(os.environ.get("MK12_TOKEN_TTL", 3600)) # Used when the token doesn't carry its own expiry
+    MIN_RELOGIN_INTERVAL = 30 # Between reactive re-logins, the token manager picks up after that
+
+    flights = SingleFlight() # Shared by every session so identical lookups coalesce across them
+    response_cache = StaleWhileRevalidateCache( # Profiles and accounts, Floyd stats only move once per match
+        fresh_ttl=float(os.environ.get("MK12_CACHE_FRESH_TTL", 30)),
+        stale_ttl=float(os.environ.get("MK12_CACHE_STALE_TTL", 300)),
+        max_size=int(os.environ.get("MK12_CACHE_SIZE", 50_000)),
+        max_bytes=int(os.environ.get("MK12_CACHE_MAX_BYTES", 128 * 1024 * 1024)),
+        name="hydra",
+    )
+    UNBATCHED_AUTH_TYPES = {"wb_network"} # `/id` gives the public id, modules only carry wbpn / hydra ids
+    player_modules_batcher = MicroBatcher(
+        window=float(os.environ.get("PLAYER_MODULES_BATCH_WINDOW", 0.005)),
+        max_batch=int(os.environ.get("PLAYER_MODULES_BATCH_SIZE", 20)),
+    )
 
     def __init__(self, steam_key: str = "", wb_creds: dict = {}):
         self.steam_key = ""
         self.wb_creds = {}
         self.access_token = ""
+        self.token_expires_at = None
+        self.login_attempted_at = 0.0
+        self.authenticating = False
+        self.upstream = ResilientCaller("Hydra") # Per session, one throttled account mustn't open the circuit for all
 
         if steam_key:
             self.setup_steam(steam_key)
@@ -31,10 +65,22 @@ class MK12API:
         self.refresh_required = True
         self.refresh_time = datetime(1970, 1, 1)
         self.lock = None
+        self.session = get_session("mk12")
 
     def set_mutex_lock(self, lock):
         self.lock = lock
 
+    @property
+    def available(self) -> bool:
+        """
+        Logged in, not in the middle of re-authenticating and its circuit isn't open (throttled or failing),
+        used by `MK12APIPool` to pick sessions.
+        """
+        return (
+            bool(self.access_token) and not self.refresh_required and not self.authenticating
+            and self.upstream.breaker.state != "open"
+        )
+
     def setup_steam(self, steam_key: str):
         if not steam_key:
             raise ValueError(f"Missing Steam Key")
@@ -61,7 +107,41 @@ class MK12API:
         return url
 
     @prevent_over_refresh()
-    def login(self):        
+    def login(self):
+        return self._login()
+
+    def refresh_ahead(self):
+        """
+        Proactive re-login before the token expires. Skips the reactive refresh lockout, the new token
+        is only swapped in once the login succeeded so in-flight requests keep the old one.
+        """
+        if not self._claim_login():
+            return # Someone else is logging in already
+        return self._login()
+
+    def _claim_login(self, lock = None, reactive: bool = False) -> bool:
+        """
+        Marks the session as authenticating unless it already is (or, for a reactive re-login, it doesn't
+        need one or was tried less than `MIN_RELOGIN_INTERVAL` seconds ago). The lock only guards this
+        check, it's never held over the login request so nobody blocks on it.
+        """
+        with lock or self.lock or nullcontext():
+            if self.authenticating:
+                return False
+            if reactive and (not self.refresh_required or time.time() - self.login_attempted_at < self.MIN_RELOGIN_INTERVAL):
+                return False
+            self.authenticating = True
+            return True
+
+    def _login(self):
+        self.login_attempted_at = time.time()
+        self.authenticating = True
+        try:
+            return self._access()
+        finally:
+            self.authenticating = False
+
+    def _access(self):
         url = self.make_url("access")
         body = {
             "auth": {
@@ -84,16 +164,17 @@ class MK12API:
         })
 
         print("MK Logging In")
-        resp = requests.post(url, json=body, headers=headers)
+        resp = self.session.post(url, json=body, headers=headers)
 
         if int(resp.status_code)//100 != 2:
-            raise ValueError(f"Received Error {resp.status_code}: {resp.json()}")
+            raise ValueError(f"Received Error {resp.status_code}: {response_json(resp)}")
 
-        resp_data: Access = resp.json()
+        resp_data: Access = response_json(resp)
 
-        self.access_token = resp_data["token"]
-        if not self.access_token:
+        if not resp_data["token"]:
             raise ValueError(f"Response 200 but token empty!")
+        self.access_token = resp_data["token"]
+        self.token_expires_at = get_token_expiry(self.access_token, self.TOKEN_TTL)
 
         self.account = resp_data["account"]
         self.profile = resp_data["profile"]
@@ -123,18 +204,20 @@ class MK12API:
 
         return headers
 
-    def api_call(self, url, body: dict = {}, headers: dict = {}, method="GET"):
+    def api_call(self, url, body: dict = {}, headers: dict = {}, method="GET", params: dict = None):
         if method.lower() == "get":
-            caller = requests.get
+            caller = self.session.get
         elif method.lower() == "post":
-            caller = requests.post
+            caller = self.session.post
         elif method.lower() == "put":
-            caller = requests.put
+            caller = self.session.put
         else:
             raise ValueError(f"Unsupported Method {method.upper()}")
 
         call_dict = {}
 
+        if params:
+            call_dict["params"] = params
         if body:
             call_dict["json"] = body
         if not headers:
@@ -142,73 +225,163 @@ class MK12API:
 
         call_dict["headers"] = headers
 
-        resp = caller(url, **call_dict)
+        resp = self.upstream.call(caller, url, **call_dict)
 
         return resp
 
     def validate_resp_auth(self, resp: requests.Response):
         if resp.status_code // 100 != 2:
-            error = HydraError.from_dict(resp.json())
-            print(f"Hydra Error {resp.status_code} ({error.hydra_error}): {error.msg}")
+            try:
+                error = HydraError.from_dict(response_json(resp))
+                print(f"Hydra Error {resp.status_code} ({error.hydra_error}): {error.msg}")
+            except (ValueError, AssertionError, KeyError, TypeError): # Not JSON or not a Hydra error body
+                print(f"Hydra Error {resp.status_code}: {resp.text[:200]}")
             if resp.status_code in [401, 403]:
                 self.refresh_required = True
                 self.refresh()
-                return False
+                raise TokenExpired(resp.status_code)
         return True
 
     def refresh(self, lock = None):
-        lock = lock or self.lock
-        if not lock:
-            return self.login()
+        """
+        Reactive re-login after an auth failure, once for all concurrent failures and at most every
+        `MIN_RELOGIN_INTERVAL` seconds. Never raises: a session that couldn't log in stays `refresh_required`
+        (out of the pool's rotation) until the token manager logs it back in.
+        """
+        if not self._claim_login(lock, reactive=True):
+            return
+        try:
+            self._login()
+        except Exception as e:
+            print(f"MK re-login failed: {e}")
+
+    @stale_while_revalidate
+    @single_flight
+    @retry_on_failure()
+    def get_profile(self, profile_id: str):
+        url = self.make_url("profiles", profile_id)
 
-        with lock:
-            if self.refresh_required:
-                return self.login()
+        resp = self.api_call(url)
+        self.validate_resp_auth(resp)
 
-    def get_profile(self, profile_id: str):
+        if resp.status_code // 100 != 2:
+            if resp.status_code == 404:
+                raise ValueError(f"Profile {profile_id} not found!")
+            raise ValueError(f"Profile {profile_id} failed with {resp.status_code}")
+
+        profile: Profile = response_json(resp)
+
+        return profile
+
+    @stale_while_revalidate
+    @single_flight
+    @retry_on_failure()
+    def get_floyd_profile(self, profile_id: str):
+        """
+        Same as `get_profile` but only decodes the Floyd stats, `change_count` and `updated_at`.
+        """
         url = self.make_url("profiles", profile_id)
 
         resp = self.api_call(url)
-        if not self.validate_resp_auth(resp):
-            return self.get_profile(profile_id)
+        self.validate_resp_auth(resp)
 
         if resp.status_code // 100 != 2:
             if resp.status_code == 404:
-                error = HydraError.from_dict(resp.json())
                 raise ValueError(f"Profile {profile_id} not found!")
+            raise ValueError(f"Profile {profile_id} failed with {resp.status_code}")
 
-        profile: Profile = resp.json()
+        profile = extract_floyd_profile(resp.content.decode("utf-8"))
+        if profile is None:
+            print(f"Profile {profile_id} has no profile_stats, falling back to a full decode")
+            profile = response_json(resp)
 
         return profile
 
+    @stale_while_revalidate
+    @single_flight
+    @retry_on_failure()
     def get_account(self, account_id: str):
         url = self.make_url("accounts", account_id)
 
         resp = self.api_call(url)
-        if not self.validate_resp_auth(resp):
-            return self.get_account(account_id)
+        self.validate_resp_auth(resp)
 
         if resp.status_code // 100 != 2:
             if resp.status_code == 404:
-                error = HydraError.from_dict(resp.json())
                 raise ValueError(f"Account {account_id} not found!")
+            raise ValueError(f"Account {account_id} failed with {resp.status_code}")
 
-        account: Account = resp.json()
+        account: Account = response_json(resp)
 
         return account
 
+    @single_flight
+    @retry_on_failure()
     def get_mk_id_from_wb(self, user_id: str, platform: str):
         if not user_id or not platform:
             raise ValueError(f"`user_id` and `platform` must be provided")
+        if "," in user_id:
+            raise ValueError(f"Invalid user id {user_id}") # Upstream splits `ids` on commas
 
-        url = self.make_invoke_url(f"player_modules_by_auth_id?auth_type={platform}&ids={user_id}")
+        if platform in self.UNBATCHED_AUTH_TYPES:
+            result = self.get_mk_ids_from_wb([user_id], platform)[user_id]
+        else:
+            result = self.player_modules_batcher.submit(
+                platform, user_id, lambda user_ids: self.get_mk_ids_from_wb(user_ids, platform)
+            )
+
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @staticmethod
+    def player_module_match_key(platform: str, user_id: str) -> str:
+        if platform == "steam":
+            steam_id = SteamID(user_id)
+            if steam_id.is_valid():
+                return str(steam_id.as_32) # MK may store another form of the same steam id
+        return str(user_id).strip().lower()
+
+    def get_mk_ids_from_wb(self, user_ids: List[str], platform: str) -> Dict[str, Union[PlayerModules, Exception]]:
+        """
+        One `player_modules_by_auth_id` call for many ids of the same platform, split back per id.
+        If the batched call fails every id is asked for alone, an id whose own call fails gets its error
+        as result so it's only raised to that caller.
+        """
+        url = self.make_invoke_url("player_modules_by_auth_id")
+        params = {"auth_type": platform, "ids": ",".join(user_ids)}
         headers = self.make_headers_dict(envelope=True, game_version=False, auth_required=False)
 
-        print(f"Fetching wbid for {user_id} on {platform}")
-        resp = self.api_call(url, headers=headers)
-        if not self.validate_resp_auth(resp):
-            return self.get_mk_id_from_wb(user_id, platform)
-
-        envelope, response = ssc_envelope_response_from_dict(resp.json(), PlayerModules)
+        print(f"Fetching wbid for {', '.join(user_ids)} on {platform}")
+        try:
+            resp = self.api_call(url, headers=headers, params=params)
+            self.validate_resp_auth(resp)
+            envelope, response = ssc_envelope_response_from_dict(response_json(resp), PlayerModules)
+        except Exception as e:
+            if len(user_ids) == 1:
+                raise
+            print(f"Batched wbid lookup failed ({type(e).__name__}: {e}), asking for each id alone")
+            response = {"player_modules": []}
+
+        if len(user_ids) == 1:
+            return {user_ids[0]: response}
+
+        results = {user_id: {"player_modules": []} for user_id in user_ids}
+        lookup = {self.player_module_match_key(platform, user_id): user_id for user_id in user_ids}
+        for module in response.get("player_modules", []):
+            user_id = lookup.get(self.player_module_match_key(platform, module.get("platform_id", "")))
+            if user_id:
+                results[user_id]["player_modules"].append(module)
+
+        # Unmatched ids are either unknown or reported differently, ask for them alone (concurrently)
+        fallbacks = {
+            user_id: spawn(self.get_mk_ids_from_wb, [user_id], platform)
+            for user_id, result in results.items() if not result["player_modules"]
+        }
+        for user_id, task in fallbacks.items():
+            try:
+                results[user_id] = task.get()[user_id]
+            except Exception as e:
+                results[user_id] = e
 
-        return response
+        return results
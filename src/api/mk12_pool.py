@@ -0,0 +1,111 @@
+import itertools
+from threading import Lock
+from typing import Dict, List
+
+from src.api.errors import CircuitOpen, TokenExpired
+from src.api.mk12 import MK12API
+
+
+class MK12APIPool:
+    """
+    Spreads calls over several logged in `MK12API` sessions (one per Steam account), picking the available
+    session with the fewest calls in flight. Sessions drop out while they re-authenticate or their circuit
+    breaker is open (each session has its own) and come back once logged in / closed. Attributes and methods resolve like on a single `MK12API`.
+    """
+
+    def __init__(self, clients: List[MK12API]):
+        if not clients:
+            raise ValueError("MK12APIPool needs at least one session")
+        self.clients = clients
+        self.lock = Lock()
+        self.rotation = itertools.count()
+        self.in_flight: Dict[int, int] = {id(client): 0 for client in clients}
+        self.calls: Dict[int, int] = {id(client): 0 for client in clients}
+        self.failovers = 0
+
+    @classmethod
+    def from_steam_keys(cls, steam_keys: List[str]) -> "MK12APIPool":
+        clients = []
+        for i, steam_key in enumerate(steam_keys):
+            client = MK12API(steam_key=steam_key)
+            client.set_mutex_lock(Lock())
+            try:
+                client.login()
+            except Exception as e:
+                print(f"MK session {i} failed to log in: {e}") # Left out of rotation until the token manager logs it in
+            clients.append(client)
+
+        if not any(client.available for client in clients):
+            raise ValueError("No MK session could log in!")
+        return cls(clients)
+
+    def __len__(self):
+        return len(self.clients)
+
+    @property
+    def primary(self) -> MK12API:
+        return next((client for client in self.clients if client.available), self.clients[0])
+
+    def acquire(self, exclude: MK12API = None) -> MK12API:
+        with self.lock:
+            candidates = [client for client in self.clients if client.available and client is not exclude]
+            if not candidates:
+                # Everyone is re-authenticating, use one anyway rather than failing
+                candidates = [client for client in self.clients if client is not exclude] or self.clients
+
+            start = next(self.rotation) % len(candidates) # Round robin between equally loaded sessions
+            candidates = candidates[start:] + candidates[:start]
+            client = min(candidates, key=lambda c: self.in_flight[id(c)])
+            self.in_flight[id(client)] += 1
+            self.calls[id(client)] += 1
+        return client
+
+    def release(self, client: MK12API):
+        with self.lock:
+            self.in_flight[id(client)] -= 1
+
+    def call(self, name: str, *args, **kwargs):
+        client = self.acquire()
+        try:
+            return getattr(client, name)(*args, **kwargs)
+        except (TokenExpired, CircuitOpen):
+            # Raised once the session's re-login failed or is throttled, or its circuit opened (it's out of
+            # rotation by then), give the request one go on another available session
+            if not any(other.available for other in self.clients if other is not client):
+                raise
+            self.failovers += 1
+            print(f"MK session failed {name}, retrying on another session")
+        finally:
+            self.release(client)
+
+        client = self.acquire(exclude=client)
+        try:
+            return getattr(client, name)(*args, **kwargs)
+        finally:
+            self.release(client)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.primary, name)
+        if not callable(attr):
+            return attr
+
+        def pooled(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        pooled.__name__ = name
+        return pooled
+
+    def stats(self) -> dict:
+        return {
+            "sessions": [
+                {
+                    "available": client.available,
+                    "authenticating": client.authenticating,
+                    "breaker": client.upstream.breaker.state,
+                    "in_flight": self.in_flight[id(client)],
+                    "calls": self.calls[id(client)],
+                    "expires_at": str(client.token_expires_at),
+                }
+                for client in self.clients
+            ],
+            "failovers": self.failovers,
+        }
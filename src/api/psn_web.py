@@ -5,6 +5,8 @@ from urllib.parse import parse_qs, urlencode
 
 import requests
 
+from src.api.http import get_session
+
 
 @dataclass
 class PSNTokens:
@@ -168,7 +170,7 @@ class PSNAuth:
         Returns:
             New PSNTokens (save the new refresh_token for next time).
         """
-        response = requests.post(
+        response = get_session("psn").post(
             cls.TOKEN_URL,
             headers={
                 "Content-Type": "application/x-www-form-urlencoded",
@@ -190,7 +192,7 @@ class PSNAuth:
     @classmethod
     def _npsso_to_code(cls, npsso: str) -> str:
         """Exchange an NPSSO cookie for an authorization code."""
-        response = requests.get(
+        response = get_session("psn").get(
             cls.AUTHORIZE_URL,
             params={
                 "access_type": "offline",
@@ -234,7 +236,7 @@ class PSNAuth:
     @classmethod
     def _code_to_tokens(cls, code: str) -> PSNTokens:
         """Exchange an authorization code for tokens."""
-        response = requests.post(
+        response = get_session("psn").post(
             cls.TOKEN_URL,
             headers={
                 "Content-Type": "application/x-www-form-urlencoded",
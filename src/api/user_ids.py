@@ -1,9 +1,9 @@
 import base64
 import json
 import os
-import requests
 from steam.steamid import SteamID, steam64_from_url
 
+from src.api.http import get_session
 from src.utils import init_secrets
 
 from src.api.xbl import Xbox
@@ -32,7 +32,7 @@ def get_psn_user_id(user: str):
     user = user.strip()
     print(f"Getting PSN Profile for {user}")
     url = "https://psn.flipscreen.games/search.php"
-    resp = requests.get(url, params={
+    resp = get_session("psn").get(url, params={
         "username": user
     })
     
@@ -1,12 +1,23 @@
 import datetime
 import os
 import re
-from typing import Optional, Union
+import time
+from contextlib import nullcontext
+from typing import Callable, Iterator, Optional, Union
 import requests
 
+from src.api.http import get_session
 from src.models.wb_network.auth import WBAuthResult
 from src.models.wb_network.invitations import PublicAccount, WBProfileCard, WBSearchResult
-from src.utils import prevent_over_refresh
+from src.api.errors import TokenExpired
+from src.api.wb_invitations import DeclineQueue, InvitationStore
+from src.utils import prevent_over_refresh, retry_on_failure
+from src.utils.cache import StaleWhileRevalidateCache
+from src.utils.concurrency import spawn
+from src.utils.jsonlib import response_json
+from src.utils.resilience import ResilientCaller
+from src.utils.singleflight import SingleFlight, single_flight
+from src.utils.tokens import get_token_expiry
 
 class WBAPI:
     ROOT_URL = "https://prod-network-api.wbagora.com"
@@ -15,6 +26,24 @@ class WBAPI:
     AUTH_URL = "sessions/auth"
 
     API_KEY = os.environ.get("WB_API_KEY", "")
+    TOKEN_TTL = 3600
+    MIN_RELOGIN_INTERVAL = 30 # See `MK12API.refresh`
+
+    flights = SingleFlight()
+    upstream = ResilientCaller("WB Network")
+    # Lookups by normalized username / email, misses are kept separately and for much less time
+    search_cache = StaleWhileRevalidateCache(
+        fresh_ttl=float(os.environ.get("WB_SEARCH_TTL", 3600)),
+        stale_ttl=float(os.environ.get("WB_SEARCH_TTL", 3600)),
+        max_size=int(os.environ.get("WB_SEARCH_CACHE_SIZE", 20_000)),
+        name="wb_search",
+    )
+    search_misses = StaleWhileRevalidateCache(
+        fresh_ttl=float(os.environ.get("WB_SEARCH_MISS_TTL", 60)),
+        stale_ttl=float(os.environ.get("WB_SEARCH_MISS_TTL", 60)),
+        max_size=int(os.environ.get("WB_SEARCH_CACHE_SIZE", 20_000)),
+        name="wb_search_misses",
+    )
 
     def __init__(self, access_token: str = "", refresh_token: str = "", authorization_code: str = ""): # Can't use api to sign in
         if not access_token and not refresh_token and not authorization_code:
@@ -28,10 +57,24 @@ class WBAPI:
         self.refresh_required = True
         self.refresh_time = datetime.datetime(1970, 1, 1)
         self.token = None
+        self.token_expires_at = None
+        self.login_attempted_at = 0.0
+        self.authenticating = False
         self.lock = None
+        self.session = get_session("wb")
+        self.invitations = InvitationStore(
+            {
+                "incoming": lambda: self.paginate(self.get_incoming, prefetch=True, state="open"),
+                "outgoing": lambda: self.paginate(self.get_outgoing, prefetch=True, state="open"),
+                "friends": lambda: self.paginate(self.get_friends, prefetch=True),
+            },
+            interval=float(os.environ.get("WB_INVITATION_SYNC_INTERVAL", 15)),
+        )
+        self.declines = DeclineQueue(self.decline_request, rate=float(os.environ.get("WB_DECLINE_RATE", 5)))
 
         if access_token:
             self.access_token = access_token
+            self.token_expires_at = get_token_expiry(access_token, self.TOKEN_TTL)
             self.set_headers()
         elif refresh_token:
             self.refresh_token = refresh_token
@@ -52,16 +95,47 @@ class WBAPI:
         self.lock = lock
 
     def refresh(self, lock = None):
-        lock = lock or self.lock
-        if not lock:
-            return self.login(self.refresh_token, "refresh_token")
+        """
+        Reactive refresh after an auth failure, see `MK12API.refresh`.
+        """
+        if not self._claim_login(lock, reactive=True):
+            return
+        try:
+            self._login(self.refresh_token, "refresh_token")
+        except Exception as e:
+            print(f"WB re-login failed: {e}")
+        finally:
+            self.authenticating = False
 
-        with lock:
-            if self.refresh_required:
-                self.login(self.refresh_token, "refresh_token")
+    def _claim_login(self, lock = None, reactive: bool = False) -> bool:
+        """
+        See `MK12API._claim_login`, the lock is never held over the login request.
+        """
+        with lock or self.lock or nullcontext():
+            if self.authenticating:
+                return False
+            if reactive and (not self.refresh_required or time.time() - self.login_attempted_at < self.MIN_RELOGIN_INTERVAL):
+                return False
+            self.authenticating = True
+            return True
 
     @prevent_over_refresh()
     def login(self, grant_token: str, grant: str = "refresh_token"):
+        return self._login(grant_token, grant)
+
+    def refresh_ahead(self):
+        """
+        Proactive refresh before the token expires, see `MK12API.refresh_ahead`.
+        """
+        if not self._claim_login():
+            return # Someone else is logging in already
+        try:
+            return self._login(self.refresh_token, "refresh_token")
+        finally:
+            self.authenticating = False
+
+    def _login(self, grant_token: str, grant: str = "refresh_token"):
+        self.login_attempted_at = time.time()
         url = self.make_url(self.AUTH_URL, "token")
 
         params = {"options": "account"}
@@ -72,7 +146,7 @@ class WBAPI:
             }
 
         print(f"WB Login!")
-        resp = requests.post(
+        resp = self.session.post(
             url,
             headers={
                 "X-Hydra-Api-Key": self.API_KEY,
@@ -85,15 +159,16 @@ class WBAPI:
         )
 
         if resp.status_code//100 != 2:
-            print(resp.json())
+            print(response_json(resp))
             raise ValueError(resp.status_code)
 
-        response: WBAuthResult = resp.json()
+        response: WBAuthResult = response_json(resp)
         access_token = response.get("access_token")
         if not access_token:
             raise ValueError(f"Empty response while refresh: {response}")
 
         self.access_token = access_token
+        self.token_expires_at = get_token_expiry(access_token, response.get("expires_in") or self.TOKEN_TTL)
         self.account = response["account"]
         self.set_headers()
 
@@ -114,184 +189,246 @@ class WBAPI:
             url += "/" + resources_string
         return url
 
+    def api_call(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.upstream.call(self.session.request, method, url, **kwargs)
+
     def check_refresh_requirement(self, resp: requests.Response):
         if resp.status_code in [400, 401, 403]:
             self.refresh_required = True
             self.refresh()
-            return False
+            raise TokenExpired(resp.status_code)
         return True
 
     def search(self, user: str) -> Optional[PublicAccount]:
+        key = user.strip().lower()
+
+        account, state = self.search_cache.lookup(key)
+        if state != "miss":
+            return account
+
+        _, state = self.search_misses.lookup(key)
+        if state != "miss":
+            return None
+
+        account = self._search(user)
+        if account is None:
+            self.search_misses.put(key, True)
+        else:
+            self.search_cache.put(key, account)
+        return account
+
+    @classmethod
+    def search_stats(cls) -> dict:
+        return {
+            "hits": cls.search_cache.fresh_hits,
+            "negative_hits": cls.search_misses.fresh_hits,
+            "misses": cls.search_misses.misses + cls.search_misses.expired,
+            "found": cls.search_cache.stats(),
+            "not_found": cls.search_misses.stats(),
+        }
+
+    @single_flight
+    @retry_on_failure()
+    def _search(self, user: str) -> Optional[PublicAccount]:
         url = self.make_url(self.SEARCH_URL)
 
         is_email = re.match(r"^[\w\.-]+@[\w\.-]+\.\w+$", user) is not None
         search_type = "email" if is_email else "username"
         print("Search by", search_type)
 
-        resp = requests.get(
-            url.format(user=user),
+        resp = self.api_call(
+            "GET", url.format(user=user),
             headers=self.headers,
             params={"expand_localization": True, "type": search_type, "value": user},
         )
 
-        if not self.check_refresh_requirement(resp):
-            return self.search(user)
+        self.check_refresh_requirement(resp)
 
         if not resp.status_code // 100 == 2:
-            print(resp.json())
+            print(response_json(resp))
             if resp.status_code == 404:
                 return None
             raise ValueError(resp.status_code)
 
-        return resp.json()
+        return response_json(resp)
 
     def search_by(self, user: Union[str, int], where: str, delete_afterwards: bool = False) -> Optional[PublicAccount]:
         if where == "incoming":
-            func = self.get_incoming
+            pass
         elif where == "outgoing":
-            func = self.get_outgoing
             delete_afterwards = False # Can't decline, only cancel # TODO: Change later with todo_afterwards
         elif where in ["friends", "friend"]:
-            func = self.get_friends
+            where = "friends"
             delete_afterwards = False # Can't decline, only remove
         else:
             raise ValueError(f"What is {where}?")
 
+        if not isinstance(user, (str, int)):
+            raise TypeError(f"What did you send? user with type {type(user)}???")
+
         try:
-            resp = func(state="open")
+            user = int(user) # Index into the newest first list
+            delete_afterwards = False
         except ValueError:
-            return None
+            pass
 
         try:
-            int_name = int(user)
+            friend = self.invitations.find(where, user)
         except ValueError:
-            int_name = None
-
-        if int_name is not None:
-            return resp["results"][int_name]["account"]
-
-        if isinstance(user, str):
-            for friend in resp["results"]:
-                if friend["account"]["username"].strip().lower() == user.strip().lower():
-                    if delete_afterwards:
-                        try:
-                            self.decline_request(friend["id"])
-                        except ValueError:
-                            print(f"Friend found but couldn't decline {friend['id']}")
-                    return friend["account"]
-        else:
-            raise TypeError(f"What did you send? user with type {type(user)}???")
+            return None
+
+        if friend is None:
+            return None
+
+        if delete_afterwards:
+            self.invitations.remove(where, friend["id"])
+            self.declines.enqueue(friend["id"])
+        return friend["account"]
+
+    def wait_by(self, username: str, where: str, timeout: float) -> Optional[PublicAccount]:
+        """
+        Long poll `search_by` for a username, declining incoming invitations the same way. Uses the card
+        `wait_for` hands back, looking it up again could make a timed out waiter sync upstream itself.
+        """
+        card = self.invitations.wait_for(where, username, timeout)
+        if card is None:
+            return None
 
-        return None
+        if where == "incoming":
+            self.invitations.remove(where, card["id"])
+            self.declines.enqueue(card["id"])
+        return card["account"]
 
-    def get_incoming(self, state: str = "open", sort: bool = True) -> WBSearchResult:
+    @single_flight
+    @retry_on_failure()
+    def get_incoming(self, state: str = "open", sort: bool = True, page: int = 1, page_size: int = 200) -> WBSearchResult:
         """
         state: one of `open` `accepted` `cancelled` `declined`
         """
         # Returned id is the invitation id and has sent_from and sent_to which can be used to identify the user's id instead of public id
         url = self.make_url(self.INVITE_URL, "incoming")
         # state = open
-        resp = requests.get(
-            url,
+        resp = self.api_call(
+            "GET", url,
             headers=self.headers,
             params={
-                "page": 1,
-                "page_size": 200,
+                "page": page,
+                "page_size": page_size,
                 "state": state,
                 "expand_localization": True
             }
         )
 
-        if not self.check_refresh_requirement(resp):
-            return self.get_incoming(state)
+        self.check_refresh_requirement(resp)
 
         if not resp.status_code // 100 == 2:
-            print(resp.json())
+            print(response_json(resp))
             raise ValueError(resp.status_code)
 
-        data: WBSearchResult = resp.json()
+        data: WBSearchResult = response_json(resp)
 
         if sort:
             return self._sort_results(data)
 
         return data
 
-    def get_outgoing(self, state: str = "open", sort: bool = True) -> WBSearchResult:
+    @single_flight
+    @retry_on_failure()
+    def get_outgoing(self, state: str = "open", sort: bool = True, page: int = 1, page_size: int = 200) -> WBSearchResult:
         # Returned id is the invitation id and has sent_from and sent_to which can be used to identify the user's id instead of public id
         url = self.make_url(self.INVITE_URL, "outgoing")
-        resp = requests.get(
-            url,
+        resp = self.api_call(
+            "GET", url,
             headers=self.headers,
             params={
-                "page": 1,
-                "page_size": 200,
+                "page": page,
+                "page_size": page_size,
                 "state": state,
                 "expand_localization": True,
             },
         )
 
-        if not self.check_refresh_requirement(resp):
-            return self.get_outgoing(state)
+        self.check_refresh_requirement(resp)
 
         if not resp.status_code // 100 == 2:
-            print(resp.json())
+            print(response_json(resp))
             raise ValueError(resp.status_code)
 
-        data: WBSearchResult = resp.json()
+        data: WBSearchResult = response_json(resp)
 
         if sort:
             return self._sort_results(data)
 
         return data
 
-    def get_friends(self, sort: bool = True, **kwargs) -> WBSearchResult:
+    @single_flight
+    @retry_on_failure()
+    def get_friends(self, sort: bool = True, page: int = 1, page_size: int = 200, **kwargs) -> WBSearchResult:
         url = self.make_url("friends", "me")
-        resp = requests.get(
-            url,
+        resp = self.api_call(
+            "GET", url,
             headers=self.headers,
             params={
-                "page": 1,
-                "page_size": 200,
+                "page": page,
+                "page_size": page_size,
                 "expand_localization": True,
             },
         )
 
-        if not self.check_refresh_requirement(resp):
-            return self.get_friends()
+        self.check_refresh_requirement(resp)
 
         if not resp.status_code // 100 == 2:
-            print(resp.json())
+            print(response_json(resp))
             raise ValueError(resp.status_code)
 
-        data: WBSearchResult = resp.json()
+        data: WBSearchResult = response_json(resp)
 
         if sort:
             return self._sort_results(data)
 
         return data
 
+    @retry_on_failure()
     def decline_request(self, invite_id: str):
         invite_id = invite_id.strip().lower()
         url = self.make_url(self.INVITE_URL, invite_id, "decline")
 
-        resp = requests.put(
-            url, headers=self.headers, params={"expand_localizations": True}
+        resp = self.api_call(
+            "PUT", url, headers=self.headers, params={"expand_localizations": True}
         )
 
-        if not self.check_refresh_requirement(resp):
-            return self.decline_request(invite_id)
+        self.check_refresh_requirement(resp)
 
         if not resp.status_code // 100 == 2:
-            print(resp.json())
+            print(response_json(resp))
             raise ValueError(resp.status_code)
 
-        data: WBProfileCard = resp.json()
+        data: WBProfileCard = response_json(resp)
         if data["id"] != invite_id or data["state"] != "declined":
             print(f"Failed to decline invitation {id}!")
             raise ValueError(data["id"] + "=" + data["state"])
 
         return True
 
+    def paginate(self, func: Callable[..., WBSearchResult], page_size: int = 200, prefetch: bool = False, **kwargs) -> Iterator[WBSearchResult]:
+        """
+        Lazily yields the pages of a listing (`get_incoming`, `get_outgoing`, `get_friends`), stop iterating
+        to stop fetching. With `prefetch` the next page is requested while the current one is consumed.
+        """
+        page = 1
+        next_page = None
+        while True:
+            data = next_page.get() if next_page else func(page=page, page_size=page_size, **kwargs)
+            total = data.get("total")
+            more = len(data["results"]) >= page_size and (total is None or page * page_size < total)
+            next_page = spawn(func, page=page + 1, page_size=page_size, **kwargs) if more and prefetch else None
+
+            yield data
+
+            if not more:
+                return
+            page += 1
+
     def _sort_results(self, data: WBSearchResult) -> WBSearchResult:
         data["results"] = sorted(
             data["results"], key=lambda x: x["created_at"], reverse=True
@@ -0,0 +1,293 @@
+import time
+from collections import deque
+from threading import Event, Lock
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from src.models.wb_network.invitations import WBProfileCard, WBSearchResult
+from src.utils.background import BackgroundWorker
+
+
+def normalize_username(username: str) -> str:
+    return username.strip().lower()
+
+
+class InvitationIndex:
+    """
+    Newest first list of invitation cards with lookups by invitation id and normalized username.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.cards: List[WBProfileCard] = []
+        self.by_id: Dict[str, WBProfileCard] = {}
+        self.by_username: Dict[str, WBProfileCard] = {}
+        self.newest = ""
+        self.synced_at = 0.0
+
+    def __len__(self):
+        return len(self.cards)
+
+    def _reindex(self):
+        self.by_id = {card["id"]: card for card in self.cards}
+        self.by_username = {}
+        for card in self.cards:
+            self.by_username.setdefault(normalize_username(card["account"]["username"]), card) # Keep the newest
+        self.newest = self.cards[0]["created_at"] if self.cards else ""
+
+    def replace(self, cards: List[WBProfileCard]):
+        with self.lock:
+            self.cards = sorted(cards, key=lambda card: card["created_at"], reverse=True)
+            self._reindex()
+            self.synced_at = time.time()
+
+    def merge(self, cards: List[WBProfileCard]) -> int:
+        """
+        Adds the cards that aren't indexed yet, returns how many were new.
+        """
+        with self.lock:
+            new = [card for card in cards if card["id"] not in self.by_id]
+            if new:
+                self.cards = sorted(self.cards + new, key=lambda card: card["created_at"], reverse=True)
+                self._reindex()
+            self.synced_at = time.time()
+        return len(new)
+
+    def remove(self, invite_id: str):
+        with self.lock:
+            if invite_id not in self.by_id:
+                return
+            self.cards = [card for card in self.cards if card["id"] != invite_id]
+            self._reindex()
+
+    def find(self, username: str) -> Optional[WBProfileCard]:
+        return self.by_username.get(normalize_username(username))
+
+    def at(self, index: int) -> Optional[WBProfileCard]:
+        cards = self.cards
+        if -len(cards) <= index < len(cards):
+            return cards[index]
+        return None
+
+
+class InvitationStore(BackgroundWorker):
+    """
+    Local copy of the WB incoming / outgoing invitations and friends, kept up to date in the background so
+    `WBAPI.search_by` is a dict lookup. Syncs add the cards that aren't indexed yet, background ones stop
+    paging at the first page entirely older than the newest indexed card. Every `full_sync_every` ticks
+    the views are rebuilt from every page to drop accepted / declined / removed entries.
+    A view is only synced once it has been looked up. While someone `wait_for`s an invitation the views
+    are polled every `poll_interval` seconds instead, one poll serving every waiter.
+    """
+    name = "wb invitation sync"
+
+    def __init__(self, fetchers: Dict[str, Callable[[], Iterator[WBSearchResult]]], interval: float = 15,
+                 full_sync_every: int = 20, min_sync_interval: float = 2, poll_interval: float = 2):
+        super().__init__(interval)
+        self.fetchers = fetchers
+        self.full_sync_every = full_sync_every
+        self.min_sync_interval = min_sync_interval
+        self.poll_interval = poll_interval
+        self.waiters_lock = Lock()
+        self.waiters: Dict[Tuple[str, str], Event] = {}
+        self.waiter_counts: Dict[Tuple[str, str], int] = {}
+        self.waits = self.wait_hits = 0
+        self.indexes: Dict[str, InvitationIndex] = {view: InvitationIndex() for view in fetchers}
+        self.active: Set[str] = set()
+        self.syncs = self.full_syncs = self.miss_syncs = self.pages = 0
+        self.hits = self.misses = 0
+
+    def sync(self, view: str, full: bool = False, username: str = "") -> int:
+        """
+        Walks the pages of `view`. An incremental sync looking for `username` stops at the page that has it
+        (or pages through everything), otherwise at the first page entirely older than the newest indexed card.
+        """
+        index = self.indexes[view]
+        full = full or not index.synced_at
+        since = index.newest
+        username = normalize_username(username)
+        cards: List[WBProfileCard] = []
+        new = 0
+
+        self.syncs += 1
+        for page in self.fetchers[view]():
+            self.pages += 1
+            if full:
+                cards.extend(page["results"])
+                continue
+
+            new += index.merge(page["results"])
+            if username:
+                if index.find(username):
+                    break
+                continue # Keep paging on a miss, WB's page order isn't trusted (see `WBAPI._sort_results`)
+            if all(card["created_at"] < since for card in page["results"]):
+                break
+
+        if full:
+            self.full_syncs += 1
+            index.replace(cards)
+            return len(index)
+        return new
+
+    def next_interval(self) -> float:
+        return self.poll_interval if self.waiters else self.interval
+
+    def tick(self):
+        full = self.ticks % self.full_sync_every == 0
+        for view in list(self.active):
+            self.sync(view, full=full)
+
+        with self.waiters_lock:
+            for (view, username), event in self.waiters.items():
+                if self.indexes[view].find(username):
+                    event.set()
+
+    def find(self, view: str, user: Union[str, int]) -> Optional[WBProfileCard]:
+        """
+        Card of `user` (a username, or a newest first index) in `view`. A username that isn't indexed
+        triggers one sync, at most every `min_sync_interval` seconds, as the invitation may be seconds old.
+        """
+        index = self.indexes[view]
+        if view not in self.active:
+            self.active.add(view)
+            self.wake()
+
+        lookup = index.at if isinstance(user, int) else index.find
+        if not index.synced_at:
+            self.sync(view)
+
+        card = lookup(user)
+        if card is None and not isinstance(user, int) and time.time() - index.synced_at >= self.min_sync_interval:
+            self.miss_syncs += 1
+            self.sync(view, username=user)
+            card = lookup(user)
+
+        if card is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return card
+
+    def wait_for(self, view: str, username: str, timeout: float) -> Optional[WBProfileCard]:
+        """
+        Blocks until `username` shows up in `view` or `timeout` seconds pass. Waiters never call upstream
+        themselves, they're woken by the background poll.
+        """
+        card = self.find(view, username)
+        if card is not None:
+            return card
+
+        key = (view, normalize_username(username))
+        with self.waiters_lock:
+            event = self.waiters.setdefault(key, Event())
+            self.waiter_counts[key] = self.waiter_counts.get(key, 0) + 1
+            self.waits += 1
+        self.wake() # Switch the worker to `poll_interval` now rather than after its current sleep
+
+        try:
+            event.wait(timeout)
+        finally:
+            with self.waiters_lock:
+                self.waiter_counts[key] -= 1
+                if not self.waiter_counts[key]:
+                    del self.waiter_counts[key]
+                    del self.waiters[key]
+
+        card = self.indexes[view].find(username)
+        if card is not None:
+            self.wait_hits += 1
+        return card
+
+    def remove(self, view: str, invite_id: str):
+        self.indexes[view].remove(invite_id)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(
+            views={
+                view: {"size": len(index), "newest": index.newest, "synced_at": index.synced_at}
+                for view, index in self.indexes.items() if view in self.active
+            },
+            syncs=self.syncs,
+            full_syncs=self.full_syncs,
+            pages=self.pages,
+            miss_syncs=self.miss_syncs,
+            hits=self.hits,
+            misses=self.misses,
+            waiting=sum(self.waiter_counts.values()),
+            waits=self.waits,
+            wait_hits=self.wait_hits,
+        )
+        return stats
+
+
+class DeclineQueue(BackgroundWorker):
+    """
+    Declines matched invitations off the request path. Every tick drains up to `batch_size` invitations,
+    at most `rate` declines per second, failed ones are retried with backoff up to `max_attempts` times.
+    """
+    name = "wb decline queue"
+
+    def __init__(self, decline: Callable[[str], bool], interval: float = 1, batch_size: int = 10,
+                 rate: float = 5, max_attempts: int = 3, retry_delay: float = 5):
+        super().__init__(interval)
+        self.decline = decline
+        self.batch_size = batch_size
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lock = Lock()
+        self.queue: Deque[Tuple[str, int, float]] = deque() # (invite id, attempts, not before)
+        self.queued: Set[str] = set()
+        self.declined = self.retries = self.failures = 0
+        self.last_failure = ""
+
+    def enqueue(self, invite_id: str):
+        with self.lock:
+            if invite_id in self.queued:
+                return
+            self.queued.add(invite_id)
+            self.queue.append((invite_id, 0, 0.0))
+        self.wake()
+
+    def tick(self):
+        now = time.time()
+        with self.lock:
+            batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+
+        for i, (invite_id, attempts, not_before) in enumerate(batch):
+            if not_before > now:
+                with self.lock:
+                    self.queue.append((invite_id, attempts, not_before))
+                continue
+            if i:
+                time.sleep(1 / self.rate)
+
+            try:
+                self.decline(invite_id)
+            except Exception as e:
+                attempts += 1
+                if attempts < self.max_attempts:
+                    self.retries += 1
+                    with self.lock:
+                        self.queue.append((invite_id, attempts, time.time() + self.retry_delay * attempts))
+                    continue
+                self.failures += 1
+                self.last_failure = f"{invite_id}: {type(e).__name__}: {e}"
+                print(f"Giving up declining invitation {self.last_failure}")
+            else:
+                self.declined += 1
+
+            with self.lock:
+                self.queued.discard(invite_id)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(
+            depth=len(self.queue),
+            declined=self.declined,
+            retries=self.retries,
+            failures=self.failures,
+            last_failure=self.last_failure,
+        )
+        return stats
@@ -1,9 +1,10 @@
 from datetime import datetime
 from typing import Optional
+import dateutil.parser
 from msal import PublicClientApplication, SerializableTokenCache
 import os
-import requests
 
+from src.api.http import get_session
 from src.utils import prevent_over_refresh
 
 class Xbox:
@@ -15,16 +16,18 @@ class Xbox:
 
     def __init__(self, client_id: str, token_cache_folder: str = ".", interactive_mode: bool = False):
         self.interactive_mode = interactive_mode
+        self.session = get_session("xbox")
         self.cache = SerializableTokenCache()
 
         self.token_cache_file = os.path.join(token_cache_folder, self.TOKEN_CACHE_PATH)
         self.load_cache()
 
         self.app = PublicClientApplication(
-            client_id, authority=self.AUTHORITY_URL, token_cache=self.cache
+            client_id, authority=self.AUTHORITY_URL, token_cache=self.cache, http_client=self.session
         )
 
         self.refresh_time = datetime(1970, 1, 1)
+        self.token_expires_at = None
         self.available = False
         self.relogin()
 
@@ -43,6 +46,13 @@ class Xbox:
 
     @prevent_over_refresh()
     def get_token(self):
+        return self._get_token()
+
+    def refresh_ahead(self):
+        self.xbl_token = self._get_token()
+        self.save_cache()
+
+    def _get_token(self):
         accounts = self.app.get_accounts()
         if accounts:
             print("Xbox Account logged in")
@@ -71,6 +81,10 @@ class Xbox:
             raise ValueError(f"Xbox Failed to get xsts token")
 
         xsts_token = xsts_ticket.get("Token")
+        try:
+            self.token_expires_at = dateutil.parser.parse(xsts_ticket["NotAfter"]).astimezone().replace(tzinfo=None)
+        except (KeyError, TypeError, ValueError):
+            self.token_expires_at = None
         xbl_token = f"XBL{self.XBL_VERSION} x={user_hash};{xsts_token}"
 
         self.available = True
@@ -105,7 +119,7 @@ class Xbox:
 
         headers = {"x-xbl-contract-version": "1", "Content-Type": "application/json"}
 
-        resp = requests.post(
+        resp = self.session.post(
             url="https://user.auth.xboxlive.com/user/authenticate",
             json=ticket_data,
             headers=headers,
@@ -127,7 +141,7 @@ class Xbox:
         headers = {"x-xbl-contract-version": "1", "Content-Type": "application/json"}
 
         url = "https://xsts.auth.xboxlive.com/xsts/authorize"
-        resp = requests.post(url, json=ticket_data, headers=headers)
+        resp = self.session.post(url, json=ticket_data, headers=headers)
 
         if resp.status_code == 200:
             return resp.json()
@@ -137,7 +151,7 @@ class Xbox:
 
     def search_users(self, gamertag: str):
         headers = self.get_headers()
-        resp = requests.get(
+        resp = self.session.get(
             self.PEOPLE_HUB_SEARCH_URL.format(gamertag=gamertag), headers=headers
         )
 
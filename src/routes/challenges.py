@@ -0,0 +1,107 @@
+from typing import Tuple
+
+from flask import Blueprint, jsonify, request
+
+from src.api.user_ids import is_valid_steam_id, sanitize_steam_user_id
+from src.routes.platforms import sanitize_platform
+from src.utils import floyd_cache
+from src.utils.floyd_randomizer import make_platform_string
+
+challenges_bp = Blueprint("challenges", __name__)
+
+MAX_BATCH_SIZE = 500
+CHALLENGE_PLATFORMS = ["ps5", "steam", "xsx", "epic"] # Same as `/data`, the others don't have Floyd
+
+
+def make_floyd_strings(entry: dict) -> Tuple[str, str, str, str]:
+    """
+    Returns (platform, platform_id, online floyd string, offline floyd string) of a player from its ids,
+    the offline string is empty for platforms without offline challenges.
+    """
+    platform = sanitize_platform(str(entry.get("platform", "")))
+    platform_id = str(entry.get("platform_id", "")).strip()
+    mk_id = str(entry.get("mk_id", "")).strip()
+    wb_id = str(entry.get("wb_id", "")).strip()
+    if not platform or not platform_id or not mk_id or not wb_id:
+        raise ValueError("`platform`, `platform_id`, `mk_id` and `wb_id` are required!")
+    if platform not in CHALLENGE_PLATFORMS:
+        raise ValueError(f"Unsupported platform `{platform}`, must be one of {', '.join(CHALLENGE_PLATFORMS)}!")
+
+    if platform == "steam":
+        if not is_valid_steam_id(platform_id):
+            raise ValueError(f"Invalid Steam id `{platform_id}`!") # Would silently become STEAM:0
+        platform_id = str(sanitize_steam_user_id(platform_id).as_64) # Sanitize cuz mk stores wrong id
+
+    floyd_string = make_platform_string(platform, platform_id, mk_id, wb_id)
+    floyd_string_offline = make_platform_string(platform, platform_id) if platform == "steam" else ""
+    return platform, platform_id, floyd_string, floyd_string_offline
+
+
+def make_counter_floyd_string(args: dict) -> str:
+    """
+    Floyd string `/counter` searches: the player's online one, or the offline one with `offline=1` (steam only).
+    """
+    _, _, floyd_string, floyd_string_offline = make_floyd_strings(args)
+    if str(args.get("offline", "")).strip().lower() in ["1", "true", "yes"]:
+        if not floyd_string_offline:
+            raise ValueError("Only steam has offline challenges.")
+        return floyd_string_offline
+    return floyd_string
+
+
+def compute_challenges(entry: dict) -> dict:
+    if not isinstance(entry, dict):
+        raise ValueError("Each entry must be an object!")
+
+    platform, platform_id, floyd_string, floyd_string_offline = make_floyd_strings(entry)
+
+    try:
+        encounters = int(entry.get("encounters", 0))
+        encounters_offline = int(entry.get("encounters_offline", 0))
+    except (TypeError, ValueError):
+        raise ValueError("`encounters` and `encounters_offline` must be numbers!")
+
+    _, challenges = floyd_cache.get_cached_challenges(floyd_string, encounters)
+
+    challenges_offline = []
+    if floyd_string_offline:
+        _, challenges_offline = floyd_cache.get_cached_challenges(floyd_string_offline, encounters_offline)
+
+    return {
+        "platform": platform,
+        "platform_id": platform_id,
+        "encounters": encounters,
+        "encounters_offline": encounters_offline,
+        "challenges": {
+            "online": challenges,
+            "offline": challenges_offline,
+        },
+    }
+
+
+@challenges_bp.get("")
+def get_challenges_route():
+    try:
+        return jsonify(compute_challenges(request.args.to_dict())), 200
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+
+@challenges_bp.post("")
+def post_challenges_route():
+    entries = request.get_json(silent=True)
+    if isinstance(entries, dict):
+        entries = [entries]
+    if not isinstance(entries, list) or not entries:
+        return jsonify(error="Body must be a JSON array of players!"), 400
+    if len(entries) > MAX_BATCH_SIZE:
+        return jsonify(error=f"At most {MAX_BATCH_SIZE} players per request!"), 400
+
+    results = []
+    for entry in entries:
+        try:
+            results.append(compute_challenges(entry))
+        except ValueError as e:
+            results.append({"error": str(e)})
+
+    return jsonify(results=results), 200
@@ -6,34 +6,43 @@ from src.api.errors import TokenExpired
 import datetime
 
 
-def retry_on_failure(before_retry_func=None):
-    @functools.wraps
+def retry_on_failure(before_retry_func=None, retries: int = 1):
     def decorator(func):
+        @functools.wraps(func)
         def wrapper(self, *args, **kwargs):
-            try:
-                return func(self, *args, **kwargs)
-            except TokenExpired:
-                if before_retry_func:
-                    before_retry_func(self)
-                return func(self, *args, **kwargs)
+            for _ in range(retries):
+                try:
+                    return func(self, *args, **kwargs)
+                except TokenExpired:
+                    if before_retry_func:
+                        before_retry_func(self)
+            return func(self, *args, **kwargs)
 
         return wrapper
     return decorator
 
+def split_steam_keys(steam_keys) -> list:
+    """
+    `creds.steam` / `STEAM_KEY` can hold one key or several (yaml list or comma separated), one per pooled session.
+    """
+    if isinstance(steam_keys, str):
+        steam_keys = steam_keys.split(",")
+    return [key.strip() for key in steam_keys or [] if key and key.strip()]
+
 def init_secrets():
     try:
         with open("secrets.yaml", encoding="utf-8") as f:
             secrets = yaml.safe_load(f)
             mk12_key = secrets["keys"]["mk"]
             wb_key = secrets["keys"].get("wb")
-            steam_key = secrets["creds"]["steam"]
+            steam_keys = split_steam_keys(secrets["creds"]["steam"])
             msclientid = secrets["creds"].get("msclientid")
             epic = secrets["creds"].get("epic", {})
             epic_client = epic.get("client")
             epic_secret = epic.get("secret")
             os.environ.update(
                 {
-                    "STEAM_KEY": steam_key,
+                    "STEAM_KEY": ",".join(steam_keys),
                     "MK12_API_KEY": mk12_key,
                     "WB_API_KEY": wb_key,
                     "OPSP_XR_CLIENT_ID": msclientid,
@@ -42,8 +51,8 @@ def init_secrets():
                 }
             )
     except FileNotFoundError:
-        steam_key = os.environ.get("STEAM_KEY")
-        if not steam_key:
+        steam_keys = split_steam_keys(os.environ.get("STEAM_KEY"))
+        if not steam_keys:
             raise ValueError(f"`steam_key` secret missing!")
         mk12_key = os.environ.get("MK12_API_KEY")
         if not mk12_key:
@@ -52,7 +61,7 @@ def init_secrets():
         if not wb_key:
             raise ValueError(f"`wb_key` secret missing!")
 
-    return steam_key, mk12_key, wb_key
+    return steam_keys, mk12_key, wb_key
 
 
 import time
@@ -0,0 +1,61 @@
+import os
+import time
+from threading import Event, Lock, Thread
+
+
+class BackgroundWorker:
+    """
+    Daemon loop calling `tick()` every `interval` seconds. Once gevent patched `threading` it runs as a greenlet.
+    `ensure_started` is safe to call on every request: it starts the loop once per process, so workers
+    created before gunicorn forks (`--preload`) still run in the worker.
+    """
+    name = "worker"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.pid = None
+        self.start_lock = Lock()
+        self.wakeup = Event()
+        self.ticks = self.errors = 0
+        self.last_error = ""
+
+    def ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            Thread(target=self.run, name=self.name, daemon=True).start()
+            print(f"Started background {self.name}")
+
+    def wake(self):
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            started = time.time()
+            try:
+                self.tick()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Background {self.name} failed: {self.last_error}")
+            self.ticks += 1
+
+            self.wakeup.wait(max(0.0, self.next_interval() - (time.time() - started)))
+            self.wakeup.clear()
+
+    def next_interval(self) -> float:
+        return self.interval
+
+    def tick(self):
+        raise NotImplementedError(self.tick.__name__)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.pid == os.getpid(),
+            "ticks": self.ticks,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,67 @@
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable, List
+
+
+class _Batch:
+    __slots__ = ("items", "full", "done", "results", "error")
+
+    def __init__(self):
+        self.items: Dict[Hashable, None] = {} # Ordered set
+        self.full = Event()
+        self.done = Event()
+        self.results: Dict[Hashable, Any] = {}
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Groups concurrent `submit` calls with the same key for up to `window` seconds (or `max_batch` items).
+    The first caller of a batch runs `func(items) -> {item: result}` once for everyone and the others
+    wait for their own item's result, errors are raised to every caller of the batch.
+    """
+
+    def __init__(self, window: float = 0.005, max_batch: int = 20):
+        self.window = window
+        self.max_batch = max_batch
+        self.lock = Lock()
+        self.pending: Dict[Hashable, _Batch] = {}
+        self.batches = self.items = 0
+
+    def submit(self, key: Hashable, item: Hashable, func: Callable[[List[Hashable]], Dict[Hashable, Any]]) -> Any:
+        with self.lock:
+            batch = self.pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self.pending[key] = _Batch()
+            batch.items[item] = None
+            if len(batch.items) >= self.max_batch:
+                self.pending.pop(key, None) # Late callers start a new batch
+                batch.full.set()
+
+        if not leader:
+            batch.done.wait()
+        else:
+            batch.full.wait(self.window)
+            with self.lock:
+                if self.pending.get(key) is batch:
+                    self.pending.pop(key)
+                self.batches += 1
+                self.items += len(batch.items)
+
+            try:
+                batch.results = func(list(batch.items))
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results.get(item)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch": round(self.items / self.batches, 2) if self.batches else 0,
+        }
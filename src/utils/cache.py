@@ -0,0 +1,216 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from src.utils import jsonlib
+from src.utils.concurrency import spawn
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Rough size in bytes of a JSON-like value, good enough to bound cache memory.
+    """
+    try:
+        return len(jsonlib.dumpb(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class LRUCache:
+    """
+    Bounded least recently used cache with hit/miss/eviction counters.
+    Optionally bounded by `max_bytes` as measured by `sizeof` (defaults to `estimate_size`).
+    Keys must be strings, numbers or tuples of those to be snapshotted with `save`.
+    """
+
+    def __init__(self, max_size: int = 10_000, name: str = "", max_bytes: int = 0, sizeof: Optional[Callable[[Any], int]] = None):
+        if max_size <= 0:
+            raise ValueError(f"`max_size` must be positive, got {max_size}")
+
+        self.name = name
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or estimate_size
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.sizes: Dict[Hashable, int] = {}
+        self.bytes = 0
+        self.lock = Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self.entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        size = self.sizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            self.pop(key) # Too big to ever fit, don't flush everything else for it
+            return
+
+        with self.lock:
+            self.bytes += size - self.sizes.pop(key, 0)
+            if size:
+                self.sizes[key] = size
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size or (self.max_bytes and self.bytes > self.max_bytes):
+                old_key, _ = self.entries.popitem(last=False)
+                self.bytes -= self.sizes.pop(old_key, 0)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            self.bytes -= self.sizes.pop(key, 0)
+            return self.entries.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def save(self, path: str):
+        with self.lock:
+            items = [[list(k) if isinstance(k, tuple) else k, v] for k, v in self.entries.items()]
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(items, f)
+        os.replace(tmp_path, path) # Never leave a half written snapshot behind
+
+    def load(self, path: str) -> Optional[int]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                items = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        for k, v in items[-self.max_size:]:
+            self.set(tuple(k) if isinstance(k, list) else k, v)
+        return len(self.entries)
+
+
+class StaleWhileRevalidateCache(LRUCache):
+    """
+    `LRUCache` of timestamped entries: younger than `fresh_ttl` they're served as is, until `stale_ttl`
+    they're served while one background refresh runs, after that they count as missing.
+    """
+
+    def __init__(self, fresh_ttl: float = 30, stale_ttl: float = 300, **kwargs):
+        if stale_ttl < fresh_ttl:
+            raise ValueError(f"`stale_ttl` ({stale_ttl}) must not be shorter than `fresh_ttl` ({fresh_ttl})")
+
+        super().__init__(sizeof=lambda entry: estimate_size(entry[1]), **kwargs)
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.refreshing: Set[Hashable] = set()
+        self.fresh_hits = self.stale_hits = self.expired = 0
+        self.refreshes = self.refresh_failures = 0
+
+    def lookup(self, key: Hashable) -> Tuple[Any, str]:
+        """
+        Returns (value, state) with state being "fresh", "stale" or "miss".
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None, "miss"
+
+        stored_at, value = entry
+        age = time.time() - stored_at
+        if age < self.fresh_ttl:
+            self.fresh_hits += 1
+            return value, "fresh"
+        if age < self.stale_ttl:
+            self.stale_hits += 1
+            return value, "stale"
+
+        self.expired += 1
+        self.pop(key)
+        return None, "miss"
+
+    def put(self, key: Hashable, value: Any):
+        self.set(key, (time.time(), value))
+
+    def revalidate(self, key: Hashable, func: Callable, *args, **kwargs):
+        """
+        Refreshes `key` with `func(*args, **kwargs)` in the background, at most once at a time per key.
+        """
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                self.put(key, func(*args, **kwargs))
+                self.refreshes += 1
+            except Exception as e:
+                self.refresh_failures += 1
+                print(f"Background refresh of {key} failed: {e}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        spawn(refresh)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(
+            fresh_ttl=self.fresh_ttl,
+            stale_ttl=self.stale_ttl,
+            fresh_hits=self.fresh_hits,
+            stale_hits=self.stale_hits,
+            expired=self.expired,
+            refreshing=len(self.refreshing),
+            refreshes=self.refreshes,
+            refresh_failures=self.refresh_failures,
+        )
+        return stats
+
+
+def stale_while_revalidate(func):
+    """
+    Method decorator caching results in the instance's `response_cache` (a `StaleWhileRevalidateCache`).
+    Errors are never cached.
+    """
+    @wraps(func)
+    def wrapper(self, *args):
+        key = (func.__name__, *args)
+        value, state = self.response_cache.lookup(key)
+        if state == "stale":
+            self.response_cache.revalidate(key, func, self, *args)
+        if state != "miss":
+            return value
+
+        value = func(self, *args)
+        self.response_cache.put(key, value)
+        return value
+    return wrapper
@@ -0,0 +1,35 @@
+from threading import Event, Thread
+from typing import Any, Callable, Optional
+
+
+class Task:
+    """
+    Runs `func` concurrently (a greenlet once gevent patched `threading`) and hands back its result,
+    or re-raises its exception, on `get()`.
+    """
+
+    def __init__(self, func: Callable, *args, **kwargs):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.thread = Thread(target=self._run, args=(func, args, kwargs), daemon=True)
+        self.thread.start()
+
+    def _run(self, func: Callable, args, kwargs):
+        try:
+            self.result = func(*args, **kwargs)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"Task did not finish within {timeout} seconds")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def spawn(func: Callable, *args, **kwargs) -> Task:
+    return Task(func, *args, **kwargs)
@@ -1,7 +1,12 @@
-from typing import Any, Dict
+import json
+import re
+from typing import Any, Callable, Dict, Optional
 
 from src.models.mk12.profile import Profile
 
+FLOYD_TRACKED_STATS = list(range(9001, 9007)) + list(range(9100, 9107))
+FLOYD_PLATFORMS = ["ps5", "xsx", ""]
+
 def get_floyd_maps():
     name_maps = {
         "profilestat9001": "ProfileStat9001",
@@ -23,9 +28,8 @@ def get_floyd_maps():
 
 
 def get_floyd_data(user_profile: Profile):
-    tracked_stats_ranges = list(range(9001, 9007)) + list(range(9100, 9107))
-    platforms = ["ps5", "xsx", ""]
-
+    tracked_stats_ranges = FLOYD_TRACKED_STATS
+    platforms = FLOYD_PLATFORMS
 
     profile_stats = (
         user_profile.get("data", {}).get("game", {}).get("profile_stats", {})
@@ -53,6 +57,249 @@ def get_floyd_data(user_profile: Profile):
     return stats_dict
 
 
+_json_decoder = json.JSONDecoder()
+_FLOYD_STAT_KEYS = {
+    f"{platform}_profilestat{stat_id}" if platform else f"profilestat{stat_id}"
+    for platform in FLOYD_PLATFORMS
+    for stat_id in FLOYD_TRACKED_STATS
+}
+_KEY_RE = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*:\s*')
+_WHITESPACE_RE = re.compile(r"\s*")
+
+
+class _Done(Exception):
+    pass
+
+
+def _walk_object(body: str, pos: int, handlers: Dict[str, Callable[[int], int]]) -> int:
+    """
+    Walks the members of the JSON object at `pos`, calling `handlers[key](value_pos) -> value_end` for
+    the wanted keys and skipping the others. Returns the position after the closing brace.
+    """
+    pos = _WHITESPACE_RE.match(body, pos).end()
+    if body[pos] != "{":
+        raise ValueError(f"Expected an object at {pos}")
+    pos = _WHITESPACE_RE.match(body, pos + 1).end()
+    if body[pos] == "}":
+        return pos + 1
+
+    while True:
+        match = _KEY_RE.match(body, pos)
+        if not match:
+            raise ValueError(f"Expected a key at {pos}")
+        handler = handlers.get(match.group(1))
+        if handler:
+            pos = handler(match.end())
+        else:
+            _, pos = _json_decoder.raw_decode(body, match.end())
+
+        pos = _WHITESPACE_RE.match(body, pos).end()
+        if body[pos] == "}":
+            return pos + 1
+        if body[pos] != ",":
+            raise ValueError(f"Expected `,` or `}}` at {pos}")
+        pos += 1
+
+
+def extract_floyd_profile(body: str) -> Optional[Profile]:
+    """
+    Pulls only the Floyd stats of `data.game.profile_stats` (plus `data.change_count` and `updated_at`)
+    out of a raw Hydra profile body, the rest of the profile after `data` is never decoded.
+    The result is a trimmed `Profile` usable by `get_floyd_data`.
+    Returns None if the body doesn't look like a profile so callers can fall back to a full decode.
+    """
+    if '"profile_stats"' not in body:
+        return None
+
+    profile: Dict[str, Any] = {}
+    data: Dict[str, Any] = {}
+
+    def read_value(target: dict, key: str):
+        def handler(pos: int) -> int:
+            target[key], end = _json_decoder.raw_decode(body, pos)
+            return end
+        return handler
+
+    def read_profile_stats(pos: int) -> int:
+        profile_stats, end = _json_decoder.raw_decode(body, pos)
+        data["game"] = {"profile_stats": {
+            section: {k: v for k, v in (profile_stats.get(section) or {}).items() if k in _FLOYD_STAT_KEYS}
+            for section in ["bitmask", "trophy"]
+        }}
+        return end
+
+    def read_data(pos: int) -> int:
+        end = _walk_object(body, pos, {
+            "game": lambda game_pos: _walk_object(body, game_pos, {"profile_stats": read_profile_stats}),
+            "change_count": read_value(data, "change_count"),
+        })
+        profile["data"] = data
+        if "updated_at" in profile:
+            raise _Done() # Nothing else needed, skip the rest of the body
+        return end
+
+    try:
+        _walk_object(body, 0, {"data": read_data, "updated_at": read_value(profile, "updated_at")})
+    except _Done:
+        pass
+    except (ValueError, IndexError) as e:
+        print(f"Couldn't extract the Floyd profile ({e}), falling back to a full decode")
+        return None
+
+    if "game" not in data:
+        return None
+    return profile # type: ignore
+
+
+FLOYD_CHALLENGES_COUNT = 37
+FLOYD_LAST_BATTLE_STATES = {
+    0: "No Fight Information",
+    9: "Lost",
+    12: "Won",
+    11: "Did not finish",
+}
+
+
+def popcount(value: int) -> int:
+    return bin(value).count("1") # int.bit_count is 3.10+ and the image runs 3.9
+
+
+def _decode_9001(tracker_dict, value):
+    tracker_dict["9001"] = value
+    return value, 0
+
+
+def _decode_encounters(tracker_dict, value):
+    tracker_dict["encounters"] = value
+    return value, 0
+
+
+def _decode_challenges_mask(tracker_dict, value):
+    bits = max(FLOYD_CHALLENGES_COUNT, value.bit_length())
+    total = popcount(value)
+    tracker_dict["challenges_checklist"] = {i + 1: bool(value >> i & 1) for i in range(bits)} # Bit 0 is challenge 1
+    tracker_dict["challenges_remaining"] = 10-total # 37 slots but 10 at most
+    tracker_dict["challenges_done"] = total
+    tracker_dict["challenges_mask"] = value
+    return format(value, f"0{FLOYD_CHALLENGES_COUNT}b"), 0
+
+
+def _decode_last_battle(tracker_dict, value):
+    value = FLOYD_LAST_BATTLE_STATES.get(value, value)
+    tracker_dict["last_battle"] = value
+    return value, 0
+
+
+def _decode_victories(tracker_dict, value):
+    tracker_dict["victories"] = value
+    return value, 0
+
+
+def _decode_next_clue(tracker_dict, value):
+    insert_value = value%501
+    if insert_value < 100:
+        tracker_dict["next_floyd_clue"] = f"You need at least {100-insert_value} fights before floyd may appear to give you a clue."
+    else:
+        tracker_dict["next_floyd_clue"] = f"Floyd will pop up within the next {500-insert_value} fights. Even if he appears, that doesn't mean this is the challenge you need to do."
+    return value, 0
+
+
+def _most_done_as(value):
+    try:
+        most_done_as, most_done = max(value.items(), key=lambda x: x[1])
+    except ValueError:
+        most_done_as, most_done = None, 0
+    except AttributeError:
+        most_done_as, most_done = "Unknown", 1 # For standarization
+        value = {"Unknown": 1}  # For standarization
+    return value, most_done_as, most_done
+
+
+def _decode_fatalities(tracker_dict, value):
+    completed = 0
+    value, most_fatalities_done_as, most_fatalities_done = _most_done_as(value)
+    if most_fatalities_done >= 5:
+        tracker_dict["you_finish_yet"] = "Complete"
+        completed += 1
+    else:
+        tracker_dict["you_finish_yet"] = "Incomplete"
+        if most_fatalities_done > 1:
+            tracker_dict["you_finish_yet"] += f" | Suggested {5-most_fatalities_done} more as {most_fatalities_done_as}"
+    count = len(value)
+    if count < 5:
+        tracker_dict["fatal_finish"] = f"You need fatalities as {5-count} more characters other than: {', '.join(value.keys())}"
+    else:
+        tracker_dict["fatal_finish"] = "Complete"
+        completed += 1
+    return value, completed
+
+
+def _decode_animalities(tracker_dict, value):
+    value, _, most_animalities_done = _most_done_as(value)
+    if most_animalities_done >= 2:
+        tracker_dict["inner_beast"] = "Complete"
+        return value, 1
+    tracker_dict["inner_beast"] = "Incomplete"
+    return value, 0
+
+
+def _completion_decoder(tracker_key):
+    def decode(tracker_dict, value):
+        tracker_dict[tracker_key] = "Complete" if value else "Incomplete"
+        return value, int(bool(value))
+    return decode
+
+
+def _decode_chapter_15(tracker_dict, value):
+    completed = 0
+    if value >= 4095:
+        value = "Complete"
+        completed = 1
+    elif value == 0:
+        value = "Not Started"
+    else:
+        value = "Started But Not Finished"
+    tracker_dict["chapter_15"] = value
+    return value, completed
+
+
+def _decode_tot_points(tracker_dict, value):
+    if value >= 20:
+        tracker_dict["tot_points"] = "Complete"
+        return value, 1
+    tracker_dict["tot_points"] = f"{20-value} Points remaining"
+    return value, 0
+
+
+def _decode_daily(tracker_dict, value):
+    if value >= 2:
+        tracker_dict["daily"] = "Complete"
+        return value, 1
+    tracker_dict["daily"] = f"{2-value} quests left"
+    return value, 0
+
+
+# Stat id -> decoder returning (raw value to report, number of profile challenges completed)
+FLOYD_STAT_DECODERS = {
+    9001: _decode_9001,
+    9002: _decode_encounters,
+    9003: _decode_challenges_mask,
+    9004: _decode_last_battle,
+    9005: _decode_victories,
+    9006: _decode_next_clue,
+    9100: _decode_fatalities,
+    9101: _decode_animalities,
+    9102: _completion_decoder("shaolin"),
+    9103: _completion_decoder("door_buster"),
+    9104: _decode_chapter_15,
+    9105: _decode_tot_points,
+    9106: _decode_daily,
+}
+FLOYD_STAT_TABLE = {
+    f"profilestat{stat_id}": (stat_id, decoder) for stat_id, decoder in FLOYD_STAT_DECODERS.items()
+}
+
+
 def parse_floyd_data(floyd_data, hydra_platform):
 
     tracker_dict = {
@@ -81,114 +328,13 @@ def parse_floyd_data(floyd_data, hydra_platform):
     profile_counter = 0
 
     for k, value in floyd_data.get(hydra_platform, floyd_data.get("")).items(): # Replaced with hydra_platform cuz the game tracks different stats
-        floyd_chal_id = int(k[-4:])
-        if floyd_chal_id == 9001:
-            tracker_dict["9001"] = value
-        elif floyd_chal_id == 9002:
-            tracker_dict["encounters"] = value
-        elif floyd_chal_id == 9003:
-            # challenges_count = 10
-            challenges_count = 37
-            _value = [bool(int(bit)) for bit in bin(value)[2:].zfill(challenges_count)]
-            total = sum(_value)
-            l = {i + 1: v for i, v in enumerate(_value[::-1])} # Reverse order!
-            # value = f"Done {total} - Remaining {10-total}"
-            tracker_dict["challenges_checklist"] = l
-            tracker_dict["challenges_remaining"] = 10-total # 37 slots but 10 at most
-            tracker_dict["challenges_done"] = total
-            tracker_dict['challenges_mask'] = value
-            value = bin(value)[2:].zfill(challenges_count)
-        elif floyd_chal_id == 9004:
-            if value == 0:
-                value = "No Fight Information"
-            elif value == 9:
-                value = "Lost"
-            elif value == 12:
-                value = "Won"
-            elif value == 11:
-                value = "Did not finish"
-            tracker_dict["last_battle"] = value
-        elif floyd_chal_id == 9005:
-            tracker_dict["victories"] = value
-        elif floyd_chal_id == 9006:
-            insert_value = value%501
-            if insert_value < 100:
-                tracker_dict["next_floyd_clue"] = f"You need at least {100-insert_value} fights before floyd may appear to give you a clue."
-            else:
-                tracker_dict["next_floyd_clue"] = f"Floyd will pop up within the next {500-insert_value} fights. Even if he appears, that doesn't mean this is the challenge you need to do."
-        elif floyd_chal_id == 9100:
-            try:
-                most_fatalities_done_as, most_fatalities_done = max(value.items(), key=lambda x: x[1])
-            except ValueError:
-                most_fatalities_done_as, most_fatalities_done = None, 0
-            except AttributeError:
-                most_fatalities_done_as, most_fatalities_done = "Unknown", 1 # For standarization
-                value = {"Unknown": 1}  # For standarization
-            if most_fatalities_done >= 5:
-                tracker_dict["you_finish_yet"] = "Complete"
-                profile_counter += 1
-            else:
-                tracker_dict["you_finish_yet"] = f"Incomplete"
-                if most_fatalities_done > 1:
-                    tracker_dict["you_finish_yet"] += f" | Suggested {5-most_fatalities_done} more as {most_fatalities_done_as}"
-            count = len(value)
-            if count < 5:
-                done_chars = value.keys()
-                tracker_dict["fatal_finish"] = f"You need fatalities as {5-count} more characters other than: {', '.join(done_chars)}"
-
-            else:
-                tracker_dict["fatal_finish"] = "Complete"
-                profile_counter += 1
-        elif floyd_chal_id == 9101:
-            try:
-                most_fatalities_done_as, most_fatalities_done = max(value.items(), key=lambda x: x[1])
-            except ValueError:
-                most_fatalities_done_as, most_fatalities_done = None, 0
-            except AttributeError:
-                most_fatalities_done_as, most_fatalities_done = "Unknown", 1
-                value = {"Unknown": 1} # For standarization
-            if most_fatalities_done >= 2:
-                tracker_dict["inner_beast"] = "Complete"
-                profile_counter += 1
-            else:
-                tracker_dict["inner_beast"] = "Incomplete"
-        elif floyd_chal_id == 9102:
-            if value:
-                tracker_dict["shaolin"] = "Complete"
-                profile_counter += 1
-            else:
-                tracker_dict["shaolin"] = "Incomplete"
-        elif floyd_chal_id == 9103:
-            if value:
-                tracker_dict["door_buster"] = "Complete"
-                profile_counter += 1
-            else:
-                tracker_dict["door_buster"] = "Incomplete"
-        elif floyd_chal_id == 9104:
-            if value >= 4095:
-                value = "Complete"
-                profile_counter += 1
-            elif value == 0:
-                value = "Not Started"
-            else:
-                value = "Started But Not Finished"
-            tracker_dict["chapter_15"] = value
-        elif floyd_chal_id == 9105:
-            insert_value = value
-            if value >= 20:
-                tracker_dict["tot_points"] = "Complete"
-                profile_counter += 1
-            else:
-                tracker_dict["tot_points"] = f"{20-value} Points remaining"
-        elif floyd_chal_id == 9106:
-            if value >= 2:
-                tracker_dict["daily"] = "Complete"
-                profile_counter += 1
-            else:
-                tracker_dict["daily"] = f"{2-value} quests left"
-
+        floyd_chal_id, decoder = FLOYD_STAT_TABLE.get(k) or (int(k[-4:]), None)
+        if decoder:
+            value, completed = decoder(tracker_dict, value)
+            profile_counter += completed
         tracker_dict_raw[floyd_chal_id] = value
-        tracker_dict["losses"] = tracker_dict["encounters"] - tracker_dict["victories"]
+
+    tracker_dict["losses"] = tracker_dict["encounters"] - tracker_dict["victories"]
 
     hints = []
     if False and tracker_dict["challenges_done"] >= 10: # Disabled due to update
@@ -0,0 +1,106 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# Same constants as `create_seeds_from_key` and `shuffler`, kept as uint64 so numpy never promotes to float
+PCG_MULTIPLIER = np.uint64(0x5851F42D4C957F2D)
+PCG_INCREMENT = np.uint64(0x280AF6FDEECF029F)
+MASK_32 = np.uint64(0xFFFFFFFF)
+CHALLENGES_COUNT = 37
+CHALLENGES_PICKED = 10
+
+
+def create_seeds_from_keys(floyd_inits, floyd_encounters) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized `create_seeds_from_key`.
+    `floyd_inits` and `floyd_encounters` are broadcast against each other so one hash can be paired with many counters.
+    """
+    floyd_inits = np.asarray(floyd_inits, dtype=np.uint64) & MASK_32
+    floyd_encounters = np.asarray(floyd_encounters, dtype=np.uint64) & MASK_32
+    floyd_seed = (floyd_inits << np.uint64(32)) | floyd_encounters
+
+    # uint64 arithmetic wraps around exactly like the `& mask_64` in the scalar version
+    neg_a1 = ~floyd_seed
+    seed_1 = PCG_INCREMENT + (PCG_INCREMENT + neg_a1) * PCG_MULTIPLIER
+    seed_2 = np.full_like(seed_1, PCG_INCREMENT)
+
+    return seed_1, seed_2
+
+
+def _next_u32(state: np.ndarray, increment: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    rot = state >> np.uint64(59)
+    xor_v = ((state >> np.uint64(27)) ^ (state >> np.uint64(45))) & MASK_32
+    left_shift = (xor_v << ((np.uint64(0) - rot) & np.uint64(0x1F))) & MASK_32
+    output = ((xor_v >> rot) | left_shift) & MASK_32
+    state = state * PCG_MULTIPLIER + increment
+    return state, output
+
+
+def shuffler_batch(seed_1, seed_2, length: int = CHALLENGES_COUNT, limit: int = CHALLENGES_PICKED) -> np.ndarray:
+    """
+    Vectorized `shuffler` over `list(range(length))`.
+    Returns an (N, limit) matrix holding the first `limit` entries of each shuffled array (0 based, like `shuffler`).
+    """
+    seed_1 = np.atleast_1d(np.asarray(seed_1, dtype=np.uint64)).copy()
+    seed_2 = np.broadcast_to(np.asarray(seed_2, dtype=np.uint64), seed_1.shape)
+    if limit <= 0 or limit > length:
+        limit = length
+
+    rows = seed_1.shape[0]
+    arrays = np.tile(np.arange(length, dtype=np.int64), (rows, 1))
+    row_ids = np.arange(rows)
+
+    for v15 in range(limit):
+        remaining = length - v15
+        v5 = (-remaining & 0xFFFFFFFF) % remaining
+
+        seed_1, v8 = _next_u32(seed_1, seed_2)
+        rejected = np.flatnonzero(v8 < np.uint64(v5))
+        while rejected.size: # Rare, only redraw the rejected rows
+            new_state, new_v8 = _next_u32(seed_1[rejected], seed_2[rejected])
+            seed_1[rejected] = new_state
+            v8[rejected] = new_v8
+            rejected = rejected[new_v8 < np.uint64(v5)]
+
+        index = (v8 % np.uint64(remaining)).astype(np.int64) + v15
+        picked = arrays[row_ids, index]
+        arrays[row_ids, index] = arrays[:, v15]
+        arrays[:, v15] = picked
+
+    return arrays[:, :limit]
+
+
+def get_challenges_batch(floyd_inits, floyd_encounters) -> np.ndarray:
+    """
+    Challenge ids (1 based) for every (hash, counter) pair, shape (N, 10).
+    """
+    seed_1, seed_2 = create_seeds_from_keys(floyd_inits, floyd_encounters)
+    return shuffler_batch(seed_1, seed_2) + 1
+
+
+def forecast_challenges(floyd_init: int, floyd_counter: int, count: int) -> np.ndarray:
+    """
+    Challenge ids for counters `floyd_counter..floyd_counter+count` (inclusive) of a single hashed platform string.
+    """
+    counters = np.arange(floyd_counter, floyd_counter + count + 1, dtype=np.uint64)
+    return get_challenges_batch(floyd_init, counters)
+
+
+def search_counters(floyd_init: int, observed, max_counter: int, near: int = 0, top: int = 10, chunk_size: int = 1 << 16) -> List[Tuple[int, int]]:
+    """
+    Scan counters `0..max_counter` for challenge sets containing the `observed` challenge ids (1 based).
+    Returns up to `top` (counter, matches) pairs, best matches first then closest to `near` (usually the stale encounters stat).
+    """
+    observed_mask = np.zeros(CHALLENGES_COUNT + 1, dtype=bool)
+    observed_mask[np.asarray(list(observed), dtype=np.int64)] = True
+
+    scores = np.empty(max_counter + 1, dtype=np.int8)
+    for start in range(0, max_counter + 1, chunk_size):
+        stop = min(start + chunk_size, max_counter + 1)
+        counters = np.arange(start, stop, dtype=np.uint64)
+        challenges = get_challenges_batch(floyd_init, counters)
+        scores[start:stop] = observed_mask[challenges].sum(axis=1)
+
+    distance = np.abs(np.arange(max_counter + 1, dtype=np.int64) - near)
+    ranked = np.lexsort((distance, -scores.astype(np.int64)))[:top]
+    return [(int(counter), int(scores[counter])) for counter in ranked if scores[counter] > 0]
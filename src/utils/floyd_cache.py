@@ -0,0 +1,107 @@
+import os
+from typing import Any, Hashable, List, Optional, Tuple
+
+from src.utils.background import BackgroundWorker
+from src.utils.cache import LRUCache
+from src.utils.floyd_randomizer import convert_profile_id_to_seed, get_challenges
+
+SNAPSHOT_PATH = os.path.join("db", "floyd_cache.json")
+
+seed_cache = LRUCache(max_size=50_000, name="seeds")
+challenge_cache = LRUCache(max_size=100_000, name="challenges")
+profile_cache = LRUCache(max_size=20_000, name="profiles", max_bytes=64 * 1024 * 1024)
+profile_cache_stale = 0
+
+
+def get_seed(floyd_string: str) -> int:
+    hashed = seed_cache.get(floyd_string)
+    if hashed is None:
+        hashed = convert_profile_id_to_seed(floyd_string)
+        seed_cache.set(floyd_string, hashed)
+    return hashed
+
+
+def get_cached_challenges(floyd_string: str, floyd_counter: int) -> Tuple[int, List[int]]:
+    """
+    Returns the hashed seed and the challenges for `floyd_counter`, computing them only once per (string, counter).
+    """
+    key = (floyd_string, floyd_counter)
+    cached = challenge_cache.get(key)
+    if cached is not None:
+        hashed, challenges = cached
+        return hashed, challenges
+
+    hashed = get_seed(floyd_string)
+    challenges = get_challenges(hashed, floyd_counter)
+    challenge_cache.set(key, (hashed, challenges))
+    return hashed, challenges
+
+
+def get_parsed_profile(hydra_id: str, tag: Hashable) -> Optional[Any]:
+    """
+    Parsed Floyd results for `hydra_id` if they were computed from the same profile `tag`
+    (change_count and everything else the results depend on), else None.
+    """
+    global profile_cache_stale
+
+    cached = profile_cache.get(hydra_id)
+    if cached is None:
+        return None
+
+    cached_tag, results = cached
+    if cached_tag != tag:
+        profile_cache_stale += 1
+        return None
+    return results
+
+
+def set_parsed_profile(hydra_id: str, tag: Hashable, results: Any):
+    profile_cache.set(hydra_id, (tag, results))
+
+
+def save_snapshot(path: str = SNAPSHOT_PATH):
+    # Only the seeds, challenge lists are cheaper to recompute than to (de)serialize
+    seed_cache.save(path + ".seeds")
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH):
+    try:
+        seed_cache.load(path + ".seeds")
+    except (ValueError, TypeError) as e:
+        print(f"Ignoring corrupt floyd cache snapshot: {e}")
+
+    print(f"Floyd cache warm with {len(seed_cache)} seeds")
+
+
+class SnapshotWorker(BackgroundWorker):
+    """
+    Saves the seed snapshot every `interval` seconds when new seeds were computed, off the request path.
+    """
+    name = "floyd cache snapshot"
+
+    def __init__(self, interval: float = 600, path: str = SNAPSHOT_PATH):
+        super().__init__(interval)
+        self.path = path
+        self.saved_misses = seed_cache.misses
+        self.saves = 0
+
+    def tick(self):
+        misses = seed_cache.misses
+        if misses == self.saved_misses:
+            return
+        save_snapshot(self.path)
+        self.saved_misses = misses
+        self.saves += 1
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["saves"] = self.saves
+        return stats
+
+
+def get_stats() -> dict:
+    return {
+        "seeds": seed_cache.stats(),
+        "challenges": challenge_cache.stats(),
+        "profiles": dict(profile_cache.stats(), stale=profile_cache_stale),
+    }
@@ -71,54 +71,77 @@ def create_seeds_from_key(floyd_init: int, floyd_encounters: int):
     return seed_1, seed_2_1
 
 
+class FloydRng:
+    """
+    PCG32 (XSH-RR) generator used by the game to pick Floyd challenges.
+    """
+    __slots__ = ("state", "increment")
+
+    MULTIPLIER = 0x5851F42D4C957F2D
+    MASK_32 = 0xFFFFFFFF
+    MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+    def __init__(self, state: int, increment: int):
+        self.state = state
+        self.increment = increment
+
+    @classmethod
+    def from_key(cls, floyd_init: int, floyd_encounters: int) -> "FloydRng":
+        return cls(*create_seeds_from_key(floyd_init, floyd_encounters))
+
+    def next_u32(self) -> int:
+        state = self.state
+        self.state = (state * self.MULTIPLIER + self.increment) & self.MASK_64
+        xor_v = ((state >> 27) ^ (state >> 45)) & self.MASK_32
+        rot = state >> 59
+        return ((xor_v >> rot) | (xor_v << (-rot & 0x1F))) & self.MASK_32
+
+    def bounded(self, n: int) -> int:
+        threshold = (-n & self.MASK_32) % n
+        while True:
+            value = self.next_u32()
+            if value >= threshold:
+                return value % n
+
+    def partial_shuffle(self, n: int, k: int) -> List[int]:
+        """
+        First `k` entries of `range(n)` after the game's Fisher-Yates shuffle, without building the whole list.
+        """
+        swapped = {}
+        picks = []
+        for i in range(min(k, n)):
+            j = self.bounded(n - i) + i
+            picks.append(swapped.get(j, j))
+            swapped[j] = swapped.get(i, i)
+        return picks
+
+
 def shuffler(array: List[int], seed_1: int, seed_2: int, limit: int = -1):
     length = len(array)
     cycles = range(length) # Perhaps -1 since last 2 arrays are always the same
     if limit > 0:
         cycles = range(limit)
-    
+
+    rng = FloydRng(seed_1, seed_2)
     for v15 in cycles:
-        v4 = seed_2
-        v5 = (-length & 0xFFFFFFFF) % length
-        v8 = v5 - 1  # This is only to enable the while loop
-        while v8 < v5:
-            v6 = seed_1
-            v7 = seed_1 >> 45
-            seed_1 = 0x5851F42D4C957F2D * seed_1
-            seed_1 &= 0xFFFFFFFFFFFFFFFF
-            seed_1 += v4
-            seed_1 &= 0xFFFFFFFFFFFFFFFF
-            xor_v = ((v6 >> 27) ^ v7) & 0xFFFFFFFF
-            shift_amt = (
-                -(v6 >> 59) & 0x1F
-            ) & 0xFFFFFFFFFFFFFFFF  # I think something is wrong here
-            left_shift = xor_v << (
-                shift_amt & 0xFFFFFFFF
-            )  # the shift_amt is int64 but xor_v is int32 and we can't afford overflow
-            left_shift &= 0xFFFFFFFF
-
-            l_right_shift = v6 >> 59
-            v8 = (xor_v >> l_right_shift) | left_shift
-            v8 &= 0xFFFFFFFF
-        index = v8 % length
-        index += v15
-        length -= 1
+        index = rng.bounded(length - v15) + v15
         if index != v15:  # Shuffle if it's not this index
-            v20 = array[index]
-            v21 = v20
-            array[index] = array[v15]
-            array[v15] = v21
+            array[index], array[v15] = array[v15], array[index]
+
+
+def get_challenges(floyd_init: int, floyd_encounters: int, count: int = 10) -> List[int]:
+    return [a + 1 for a in FloydRng.from_key(floyd_init, floyd_encounters).partial_shuffle(37, count)]
 
 
 if __name__ == "__main__":
     array = list(range(37))
 
-    string = "PLATFORM:PLATFORM_ID/MK_ACCOUNT_ID/WB_PRIVATE_ACCOUNT_ID"
     floyd_counter = 5
     string = make_platform_string(
+        "PLATFORM", "PLATFORM_ID", "MK_ACCOUNT_ID", "WB_PRIVATE_ACCOUNT_ID"
     )
 
-    hashed = convert_profile_id_to_seed(string)  # expect 0x3D9C8B74
+    hashed = convert_profile_id_to_seed(string)
     print(f"Hashed {string} -> {hex(hashed)}")
 
     print(f"Shuffling counter = {floyd_counter}")
@@ -0,0 +1,90 @@
+import json
+from typing import Any, Callable, Optional, Union
+
+import requests
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # Optional, stdlib json does the same job slower
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumpb(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    Compact UTF-8 JSON bytes of `obj`.
+    """
+    if orjson:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError: # Ints over 64 bits and the like, let stdlib have a go
+            pass
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    return dumpb(obj, default).decode("utf-8")
+
+
+def response_json(resp: requests.Response) -> Any:
+    """
+    Drop in for `resp.json()` using the fast backend, raises ValueError on invalid bodies like it does.
+    """
+    return loads(resp.content)
+
+
+def sort_keys(obj: Any) -> Any:
+    """
+    Copy of `obj` with every dict in `sorted` key order, like stdlib `sort_keys` (int keys sort numerically,
+    orjson's `OPT_SORT_KEYS` would sort them as strings).
+    """
+    if isinstance(obj, dict):
+        return {key: sort_keys(obj[key]) for key in sorted(obj)}
+    if isinstance(obj, (list, tuple)):
+        return [sort_keys(value) for value in obj]
+    return obj
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider writing responses with orjson when it's installed, same output as the default
+    provider otherwise (apart from non ASCII characters being sent as UTF-8 instead of escaped).
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if not orjson or set(kwargs) - {"indent", "separators"}:
+            return super().dumps(obj, **kwargs)
+        return self.dumpb(obj, indent=bool(kwargs.get("indent"))).decode("utf-8")
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if not orjson or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def dumpb(self, obj: Any, indent: bool = False) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME # Keep Flask's date format
+        if indent:
+            option |= orjson.OPT_INDENT_2
+
+        try:
+            if self.sort_keys:
+                obj = sort_keys(obj)
+            return orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            return super().dumps(obj, indent=2 if indent else None, separators=None if indent else (",", ":")).encode("utf-8")
+
+    def response(self, *args: Any, **kwargs: Any):
+        if not orjson:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumpb(obj, indent) + b"\n", mimetype=self.mimetype)
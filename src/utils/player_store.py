@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import List, Optional, Tuple
+
+from src.models.mk12.wb.player_modules import PlayerModule
+from src.utils import jsonlib
+
+
+class PlayerModuleStore:
+    """
+    Persistent (auth_type, user_id) -> player modules mapping in SQLite (WAL mode), so the hydra / wbpn ids
+    of returning players survive restarts and don't need a `player_modules_by_auth_id` round trip.
+    """
+
+    def __init__(self, path: str = os.path.join("db", "player_modules.sqlite"), ttl: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.lock = Lock()
+        self.hits = self.stale = self.misses = 0
+        self.pid = None
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self.pid == os.getpid():
+            return self._conn
+
+        # (Re)connect per process, sqlite connections must not cross gunicorn's --preload fork
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS player_modules ("
+            " auth_type TEXT NOT NULL,"
+            " user_id TEXT NOT NULL,"
+            " modules TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (auth_type, user_id))"
+        )
+        self._conn, self.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def make_key(auth_type: str, user_id: str) -> Tuple[str, str]:
+        return auth_type.strip().lower(), user_id.strip().lower()
+
+    def get(self, auth_type: str, user_id: str) -> Tuple[Optional[List[PlayerModule]], bool]:
+        """
+        Returns (modules, fresh). `modules` is None when nothing is stored.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT modules, updated_at FROM player_modules WHERE auth_type = ? AND user_id = ?",
+                self.make_key(auth_type, user_id),
+            ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None, False
+
+        modules, updated_at = row
+        fresh = time.time() - updated_at < self.ttl
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale += 1
+        return jsonlib.loads(modules), fresh
+
+    def set(self, auth_type: str, user_id: str, modules: List[PlayerModule]):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO player_modules (auth_type, user_id, modules, updated_at) VALUES (?, ?, ?, ?)",
+                (*self.make_key(auth_type, user_id), jsonlib.dumps(modules), time.time()),
+            )
+
+    def stats(self) -> dict:
+        with self.lock:
+            size, = self.conn.execute("SELECT COUNT(*) FROM player_modules").fetchone()
+        return {
+            "size": size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "stale": self.stale,
+            "misses": self.misses,
+        }
@@ -0,0 +1,172 @@
+import random
+import time
+from threading import Lock
+from typing import Callable, Iterable
+
+import requests
+
+from src.api.errors import CircuitOpen
+
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and fails fast with `CircuitOpen`
+    for `reset_timeout` seconds, then lets a single probe call through (half open) to decide.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = Lock()
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        if time.time() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return
+            self.rejected += 1
+            retry_in = max(0, self.reset_timeout - (time.time() - self.opened_at))
+        raise CircuitOpen(f"{self.name} is unavailable, try again in {retry_in:.0f} seconds.")
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+
+    def release_probe(self):
+        """
+        For calls that ended without telling anything about the upstream (killed greenlet, bug...).
+        """
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.failures >= self.failure_threshold:
+                if self.failures == self.failure_threshold:
+                    self.trips += 1
+                self.opened_at = time.time() # A failed probe reopens for another full timeout
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudget:
+    """
+    Caps retries to `ratio` of the calls seen in the current `window` (plus `min_retries`),
+    so an outage can't multiply upstream traffic.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10, window: float = 60):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self.lock = Lock()
+        self.window_start = time.time()
+        self.calls = self.retries = 0
+        self.exhausted = 0
+
+    def _roll(self):
+        if time.time() - self.window_start >= self.window:
+            self.window_start = time.time()
+            self.calls = self.retries = 0
+
+    def record_call(self):
+        with self.lock:
+            self._roll()
+            self.calls += 1
+
+    def try_retry(self) -> bool:
+        with self.lock:
+            self._roll()
+            if self.retries >= self.min_retries + self.ratio * self.calls:
+                self.exhausted += 1
+                return False
+            self.retries += 1
+            return True
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "exhausted": self.exhausted,
+        }
+
+
+class ResilientCaller:
+    """
+    Runs upstream HTTP calls through a circuit breaker, retrying transport errors and
+    `RETRYABLE_STATUS_CODES` with jittered exponential backoff within a retry budget.
+    """
+
+    def __init__(self, name: str, max_attempts: int = 3, base_delay: float = 0.2, max_delay: float = 2.0,
+                 retry_statuses: Iterable[int] = RETRYABLE_STATUS_CODES):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = set(retry_statuses)
+        self.breaker = CircuitBreaker(name)
+        self.budget = RetryBudget()
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)) # Full jitter
+
+    def call(self, func: Callable[..., requests.Response], *args, **kwargs) -> requests.Response:
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                resp = func(*args, **kwargs)
+            except requests.RequestException as e:
+                self.breaker.record_failure()
+                if not isinstance(e, RETRYABLE_EXCEPTIONS) or attempt + 1 >= self.max_attempts or not self.budget.try_retry():
+                    raise
+                print(f"{self.name} call failed ({type(e).__name__}), retrying")
+            except BaseException:
+                self.breaker.release_probe() # Never leave the breaker stuck half open
+                raise
+            else:
+                if resp.status_code not in self.retry_statuses and resp.status_code // 100 != 5:
+                    self.breaker.record_success()
+                    return resp
+                self.breaker.record_failure()
+                if resp.status_code not in self.retry_statuses or attempt + 1 >= self.max_attempts or not self.budget.try_retry():
+                    return resp
+                print(f"{self.name} returned {resp.status_code}, retrying")
+
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "retry_budget": self.budget.stats(),
+        }
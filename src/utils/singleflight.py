@@ -0,0 +1,75 @@
+from functools import wraps
+from threading import Event, Lock, get_ident
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("event", "leader", "result", "error")
+
+    def __init__(self, leader: int):
+        self.event = Event()
+        self.leader = leader
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function and everyone
+    arriving while it's in flight waits for and shares its result (or its exception).
+    Uses `threading` primitives so it cooperates with greenlets once gevent has patched them.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.calls: Dict[Hashable, _Call] = {}
+        self.executed = self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        with self.lock:
+            call = self.calls.get(key)
+            if call is None:
+                call = self.calls[key] = _Call(get_ident())
+                self.executed += 1
+            elif call.leader == get_ident(): # Retry from inside the leader itself (refresh then call again)
+                call = None
+            else:
+                self.coalesced += 1
+
+        if call is None:
+            return func(*args, **kwargs)
+
+        if call.leader != get_ident():
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
+
+
+def single_flight(func):
+    """
+    Method decorator coalescing identical concurrent calls through the instance's `flights` group.
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        return self.flights.do(key, func, self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,84 @@
+import base64
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict
+
+from src.utils.background import BackgroundWorker
+
+
+def get_token_expiry(token: str, default_ttl: float) -> datetime:
+    """
+    Expiry of `token` from its JWT `exp` claim, or `default_ttl` seconds from now for opaque tokens.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return datetime.fromtimestamp(int(claims["exp"]))
+    except (IndexError, KeyError, TypeError, ValueError):
+        return datetime.now() + timedelta(seconds=default_ttl)
+
+
+class TokenManager(BackgroundWorker):
+    """
+    Refreshes registered clients shortly before their `token_expires_at` through their `refresh_ahead()`,
+    so user requests don't pay for logins or run into `prevent_over_refresh`. Clients that are
+    `refresh_required` (a failed reactive refresh, or a login that failed at startup) are logged in again
+    whatever their expiry, backing off exponentially up to `max_backoff` seconds while that keeps failing.
+    """
+    name = "token manager"
+
+    def __init__(self, margin: float = 300, interval: float = 30, max_backoff: float = 600):
+        super().__init__(interval)
+        self.margin = timedelta(seconds=margin)
+        self.max_backoff = max_backoff
+        self.clients: Dict[str, object] = {}
+        self.refreshes: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+        self.failure_streaks: Dict[str, int] = {}
+        self.retry_at: Dict[str, float] = {}
+
+    def register(self, name: str, client):
+        if client is None:
+            return
+        self.clients[name] = client
+        self.refreshes.setdefault(name, 0)
+        self.failures.setdefault(name, 0)
+        self.failure_streaks.setdefault(name, 0)
+        self.retry_at.setdefault(name, 0.0)
+
+    def tick(self):
+        now = datetime.now()
+        for name, client in list(self.clients.items()):
+            expires_at = getattr(client, "token_expires_at", None)
+            if time.time() < self.retry_at[name] or getattr(client, "authenticating", False):
+                continue
+            elif getattr(client, "refresh_required", False):
+                print(f"{name} needs a new token, logging in again") # Failed reactive refresh or startup login
+            elif expires_at is None or now < expires_at - self.margin:
+                continue
+            else:
+                print(f"{name} token expires at {expires_at}, refreshing ahead")
+            try:
+                client.refresh_ahead()
+                self.refreshes[name] += 1
+                self.failure_streaks[name] = 0
+            except Exception as e:
+                self.failures[name] += 1
+                self.failure_streaks[name] += 1
+                backoff = min(self.interval * 2 ** (self.failure_streaks[name] - 1), self.max_backoff)
+                self.retry_at[name] = time.time() + backoff
+                print(f"{name} proactive refresh failed, retrying in {backoff:.0f}s: {e}")
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["clients"] = {
+            name: {
+                "expires_at": str(getattr(client, "token_expires_at", None)),
+                "refreshes": self.refreshes[name],
+                "failures": self.failures[name],
+                "retry_at": self.retry_at[name],
+            }
+            for name, client in self.clients.items()
+        }
+        return stats
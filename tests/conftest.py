@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Dummy secrets so modules calling `init_secrets` at import time load without a secrets.yaml
+os.environ.setdefault("STEAM_KEY", "0800")
+os.environ.setdefault("MK12_API_KEY", "test")
+os.environ.setdefault("WB_API_KEY", "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+import pytest
+from flask import Flask
+
+from src.routes.challenges import challenges_bp, make_counter_floyd_string
+
+PLAYER = {"platform": "steam", "platform_id": "76561198000000000", "mk_id": "mk", "wb_id": "wb"}
+
+
+@pytest.fixture
+def client():
+    app = Flask("test")
+    app.register_blueprint(challenges_bp, url_prefix="/challenges")
+    return app.test_client()
+
+
+def test_get_valid_steam_id(client):
+    resp = client.get("/challenges", query_string=PLAYER)
+    assert resp.status_code == 200
+    assert resp.get_json()["platform_id"] == "76561198000000000"
+
+
+@pytest.mark.parametrize("platform_id", ["abc", "-1", "0"])
+def test_get_rejects_invalid_steam_id(client, platform_id):
+    resp = client.get("/challenges", query_string=dict(PLAYER, platform_id=platform_id))
+    assert resp.status_code == 400
+    assert "Invalid Steam id" in resp.get_json()["error"]
+
+
+def test_post_rejects_invalid_steam_id_per_entry(client):
+    resp = client.post("/challenges", json=[PLAYER, dict(PLAYER, platform_id="abc"), dict(PLAYER, platform_id="-1")])
+    assert resp.status_code == 200
+    results = resp.get_json()["results"]
+    assert results[0]["platform_id"] == "76561198000000000"
+    assert all("Invalid Steam id" in result["error"] for result in results[1:])
+
+
+@pytest.mark.parametrize("offline", ["", "1"])
+@pytest.mark.parametrize("platform_id", ["abc", "-1"])
+def test_counter_rejects_invalid_steam_id(platform_id, offline):
+    with pytest.raises(ValueError, match="Invalid Steam id"):
+        make_counter_floyd_string(dict(PLAYER, platform_id=platform_id, offline=offline))
+
+
+def test_counter_floyd_strings():
+    online = make_counter_floyd_string(PLAYER)
+    offline = make_counter_floyd_string(dict(PLAYER, offline="1"))
+    assert online != offline
+    assert "76561198000000000" in offline
+    with pytest.raises(ValueError, match="Only steam"):
+        make_counter_floyd_string(dict(PLAYER, platform="ps5", platform_id="123", offline="1"))
@@ -0,0 +1,44 @@
+from src.api.mk12 import MK12API
+from src.api.mk12_pool import MK12APIPool
+
+
+class FakeResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class FakeSession:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        return FakeResponse(self.status_code)
+
+
+def make_client(status_code: int) -> MK12API:
+    client = MK12API()
+    client.access_token = "token"
+    client.refresh_required = False
+    client.session = FakeSession(status_code)
+    client.upstream.max_attempts = 1 # No backoff sleeps
+    return client
+
+
+def test_throttled_session_only_opens_its_own_circuit():
+    throttled, healthy = make_client(429), make_client(200)
+    pool = MK12APIPool([throttled, healthy])
+
+    for _ in range(throttled.upstream.breaker.failure_threshold):
+        assert throttled.api_call("url").status_code == 429
+
+    assert throttled.upstream.breaker.state == "open"
+    assert healthy.upstream.breaker.state == "closed"
+    assert not throttled.available and healthy.available
+
+    calls = throttled.session.calls
+    for _ in range(4):
+        assert pool.call("api_call", "url").status_code == 200
+    assert throttled.session.calls == calls
+    assert healthy.session.calls == 4
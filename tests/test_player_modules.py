@@ -0,0 +1,74 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import src.api.mk12 as mk12
+from src.api.mk12 import MK12API
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: dict):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode()
+        self.text = self.content.decode()
+
+
+class FakeMK12API(MK12API):
+    """
+    Answers `player_modules_by_auth_id` with one module per requested id, ids in `broken` fail a whole batch
+    and their own single id call.
+    """
+
+    def __init__(self, broken: set = frozenset()):
+        super().__init__()
+        self.broken = broken
+        self.calls = []
+
+    def api_call(self, url, body: dict = {}, headers: dict = {}, method="GET", params: dict = None):
+        self.calls.append(params)
+        ids = params["ids"].split(",")
+        if self.broken & set(ids):
+            raise requests.ConnectionError("reset")
+        return FakeResponse(200, {"player_modules": [{"platform_id": user_id, "wbid": f"wb-{user_id}"} for user_id in ids]})
+
+
+@pytest.fixture(autouse=True)
+def plain_envelope(monkeypatch):
+    monkeypatch.setattr(mk12, "ssc_envelope_response_from_dict", lambda data, _: (None, data))
+    monkeypatch.setattr(MK12API, "player_modules_batcher", mk12.MicroBatcher(window=0.2, max_batch=3))
+
+
+def lookup_concurrently(api: MK12API, user_ids):
+    def lookup(user_id):
+        try:
+            return api.get_mk_id_from_wb.__wrapped__.__wrapped__(api, user_id, "psn")
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(len(user_ids)) as pool:
+        return list(pool.map(lookup, user_ids))
+
+
+def test_ids_are_sent_as_params():
+    api = FakeMK12API()
+    results = lookup_concurrently(api, ["1&auth_type=steam", "2#x", "3"])
+    assert api.calls == [{"auth_type": "psn", "ids": "1&auth_type=steam,2#x,3"}]
+    assert [result["player_modules"][0]["wbid"] for result in results] == ["wb-1&auth_type=steam", "wb-2#x", "wb-3"]
+
+
+def test_comma_in_id_is_rejected():
+    api = FakeMK12API()
+    with pytest.raises(ValueError):
+        api.get_mk_id_from_wb.__wrapped__.__wrapped__(api, "1,2", "psn")
+    assert not api.calls
+
+
+def test_failed_batch_falls_back_per_id():
+    api = FakeMK12API(broken={"2"})
+    results = lookup_concurrently(api, ["1", "2", "3"])
+    assert len(api.calls) == 4 # The batch, then one call per id
+    assert results[0]["player_modules"][0]["wbid"] == "wb-1"
+    assert isinstance(results[1], requests.ConnectionError)
+    assert results[2]["player_modules"][0]["wbid"] == "wb-3"
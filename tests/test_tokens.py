@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from src.api.mk12 import MK12API
+from src.api.mk12_pool import MK12APIPool
+from src.utils.tokens import TokenManager
+
+
+def stub_access(down: set):
+    def _access(self: MK12API):
+        if self.steam_key in down:
+            raise ValueError(503)
+        self.access_token = f"token-{self.steam_key}"
+        self.token_expires_at = datetime.now() + timedelta(hours=1)
+        self.refresh_required = False
+    return _access
+
+
+def test_session_down_at_startup_comes_back(monkeypatch):
+    down = {"0801"}
+    monkeypatch.setattr(MK12API, "_access", stub_access(down))
+    pool = MK12APIPool.from_steam_keys(["0800", "0801"])
+    up, late = pool.clients
+    assert up.available and not late.available
+    assert late.token_expires_at is None
+
+    manager = TokenManager(interval=0)
+    manager.register("up", up)
+    manager.register("late", late)
+
+    manager.tick() # Still down, backs off
+    assert not late.available
+    assert manager.failures["late"] == 1
+    assert manager.retry_at["late"] > 0
+
+    down.clear()
+    manager.retry_at["late"] = 0.0 # Skip the backoff
+    manager.tick()
+    assert late.available
+    assert manager.refreshes["late"] == 1
+    assert manager.refreshes["up"] == 0 # Not expiring, left alone
+
+
+def test_backoff_grows_while_login_keeps_failing(monkeypatch):
+    monkeypatch.setattr(MK12API, "_access", stub_access({"0800"}))
+    monkeypatch.setattr("src.utils.tokens.time.time", lambda: 1000.0)
+    client = MK12API(steam_key="0800")
+    manager = TokenManager(interval=10, max_backoff=25)
+    manager.register("mk12", client)
+
+    backoffs = []
+    for _ in range(3):
+        manager.retry_at["mk12"] = 0.0
+        manager.tick()
+        backoffs.append(manager.retry_at["mk12"] - 1000.0)
+    assert backoffs == [10, 20, 25]
+
+    manager.tick() # Inside the backoff, not retried
+    assert manager.failures["mk12"] == 3
@@ -0,0 +1,62 @@
+from src.api.wb_invitations import InvitationStore
+
+
+def card(invite_id: str, username: str, created_at: str) -> dict:
+    return {"id": invite_id, "account": {"username": username}, "created_at": created_at}
+
+
+class Pages:
+    def __init__(self, *pages):
+        self.pages = [list(page) for page in pages]
+        self.walked = []
+
+    def __call__(self):
+        for i, page in enumerate(self.pages):
+            self.walked.append(i)
+            yield {"results": list(page)}
+
+
+def synced_store(pages: Pages) -> InvitationStore:
+    store = InvitationStore({"incoming": pages})
+    store.sync("incoming")
+    pages.walked.clear()
+    return store
+
+
+def test_background_sync_stops_at_first_page_older_than_newest():
+    pages = Pages([card("c", "C", "3"), card("b", "B", "2")], [card("a", "A", "1")], [card("z", "Z", "0")])
+    store = synced_store(pages)
+
+    pages.pages[0].insert(0, card("d", "D", "4"))
+    assert store.sync("incoming") == 1
+    assert pages.walked == [0, 1] # Page 1 is entirely older than "3", page 2 is never fetched
+
+
+def test_same_timestamp_invitation_is_not_dropped():
+    pages = Pages([card("b", "B", "2")])
+    store = synced_store(pages)
+
+    pages.pages[0].append(card("x", "X", "2"))
+    assert store.sync("incoming") == 1
+    assert store.indexes["incoming"].find("x")["id"] == "x"
+
+
+def test_username_miss_pages_until_found_with_oldest_first_pages():
+    pages = Pages([card("a", "A", "1")], [card("b", "B", "2")], [card("c", "C", "3")])
+    store = synced_store(pages)
+
+    pages.pages[1].append(card("new", "Late", "4"))
+    assert store.sync("incoming") == 0 # Page 0 is older than the newest card, a background sync stops there
+    assert pages.walked == [0]
+
+    pages.walked.clear()
+    assert store.sync("incoming", username="late") == 1
+    assert pages.walked == [0, 1] # Stops once found
+    assert store.indexes["incoming"].find("LATE")["id"] == "new"
+
+
+def test_full_sync_walks_every_page():
+    pages = Pages([card("b", "B", "2")], [card("a", "A", "1")])
+    store = synced_store(pages)
+    assert store.sync("incoming", full=True) == 2
+    assert pages.walked == [0, 1]
@@ -0,0 +1,38 @@
+from src.api.wb import WBAPI
+from src.api.wb_invitations import InvitationStore
+
+
+def make_api(cards: list):
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        yield {"results": list(cards)}
+
+    api = WBAPI(access_token="token")
+    api.invitations = InvitationStore({"incoming": fetch, "friends": fetch}, min_sync_interval=0.01)
+    declined = []
+    api.declines.enqueue = declined.append
+    return api, fetches, declined
+
+
+def test_timed_out_wait_makes_no_upstream_call_of_its_own():
+    api, fetches, declined = make_api([])
+    assert api.wait_by("nobody", "incoming", timeout=0.05) is None
+    assert len(fetches) == 1 # The first sync of the view, the worker isn't running
+    assert not declined
+
+
+def test_found_incoming_invitation_is_declined():
+    card = {"id": "inv", "account": {"username": "Foo", "public_id": "pub"}, "created_at": "1"}
+    api, fetches, declined = make_api([card])
+    assert api.wait_by("foo", "incoming", timeout=0.05)["public_id"] == "pub"
+    assert declined == ["inv"]
+    assert api.invitations.indexes["incoming"].find("foo") is None
+
+
+def test_found_friend_is_not_declined():
+    card = {"id": "fr", "account": {"username": "Foo", "public_id": "pub"}, "created_at": "1"}
+    api, fetches, declined = make_api([card])
+    assert api.wait_by("foo", "friends", timeout=0.05)["public_id"] == "pub"
+    assert not declined